@@ -12,9 +12,13 @@ if 'cms' in settings.INSTALLED_APPS:
         print 'CMS not installed'
     
 import reversion
+from django.utils import timezone
+from blogging import scheduler, search
 
 def mark_published(modeladmin, request, queryset):
     queryset.update(published_flag = 1)
+    # post_save is sent for the posts going live, so counts and caches follow them
+    scheduler.publish(list(queryset.filter(is_live = 0, publication_start__lte=timezone.now())))
 mark_published.short_description = "Mark selected content as published"
 
 
@@ -40,6 +44,14 @@ if 'cms' in settings.INSTALLED_APPS:
         prepopulated_fields = {'slug': ('title',), }
         form = PostForm
         frontend_editable_fields = ('title', 'data')
+
+        def get_search_results(self, request, queryset, search_term):
+            """
+            Search titles and contents through the full text index when it is available.
+            """
+            if search_term.strip() and search.is_available():
+                return search.filter_matches(queryset, search_term), False
+            return super(ContentAdmin, self).get_search_results(request, queryset, search_term)
         fieldsets = [
                      ('Info',     {'fields': ['title','slug', 'data','publication_start']} ),
                      ('Other',     {'fields': ['section', 'author_id', 'published_flag', 'special_flag', 'content_type','tags']} )
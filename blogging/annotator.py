@@ -0,0 +1,368 @@
+"""
+Streaming annotator that gives ids to the paragraphs of a post body.
+
+The html is tokenized once, without building a tree, and the result is the
+same bytes tag_lib.insert_tag_id_soup writes through BeautifulSoup and
+html5lib: top level <p> and <img> get an id, top level lists get ids on their
+items if one of them is long enough and on the list itself otherwise, and
+every p, span and img gets style=" ". Markup that html5lib would repair or
+that BeautifulSoup serializes in its own way (misnested or unclosed tags,
+unknown elements, comments, ambiguous character references, non ascii text
+outside any element) raises Unsupported so the caller can fall back to the
+tree based implementation.
+"""
+import re
+import sys
+from htmlentitydefs import name2codepoint
+
+
+class Unsupported(Exception):
+	"""
+	Raised for markup the annotator can not reproduce byte for byte.
+	"""
+
+
+VOID_ELEMENTS = frozenset(['br', 'hr', 'img'])
+HEADINGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+ELEMENTS = VOID_ELEMENTS | HEADINGS | frozenset([
+	'a', 'abbr', 'b', 'big', 'blockquote', 'cite', 'code', 'del', 'div', 'em', 'font',
+	'i', 'ins', 'li', 'mark', 'ol', 'p', 'q', 's', 'small', 'span', 'strike', 'strong',
+	'sub', 'sup', 'tt', 'u', 'ul'])
+# start tags that make html5lib close an open <p>
+CLOSES_P = HEADINGS | frozenset(['blockquote', 'div', 'hr', 'li', 'ol', 'p', 'ul'])
+# elements that end the search for an open <li> when a new one starts
+LIST_ITEM_SCOPE = HEADINGS | frozenset(['blockquote', 'ol', 'ul'])
+LIST_ELEMENTS = frozenset(['ol', 'ul'])
+STYLED_ELEMENTS = frozenset(['img', 'p', 'span'])
+# attributes BeautifulSoup keeps as lists and writes back with single spaces
+LIST_ATTRIBUTES = frozenset(['class', 'accesskey', 'dropzone'])
+LINK_LIST_ATTRIBUTES = LIST_ATTRIBUTES | frozenset(['rel', 'rev'])
+# names html5lib also decodes without a trailing ';', and the ones it decodes differently
+LEGACY_ENTITIES = frozenset(name2codepoint) | frozenset(['AMP', 'COPY', 'GT', 'LT', 'QUOT', 'REG'])
+CHANGED_ENTITIES = frozenset(['lang', 'rang'])
+
+ATTRIBUTE = r'''(?:\s+|(?<=["'])){name}(?:\s*=\s*(?:"{dq}"|'{sq}'|{uq}))?'''
+ATTRIBUTE_RE = re.compile(ATTRIBUTE.format(name=r'([a-zA-Z_:][-a-zA-Z0-9_:.]*)', dq=r'([^"]*)',
+										sq=r"([^']*)", uq=r'''([^\s"'=<>`]+)'''))
+START_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)((?:' +
+						ATTRIBUTE.format(name=r'[a-zA-Z_:][-a-zA-Z0-9_:.]*', dq=r'[^"]*',
+										sq=r"[^']*", uq=r'''[^\s"'=<>`]+''') +
+						r')*)\s*(/?)>')
+END_TAG_RE = re.compile(r'</([a-zA-Z][a-zA-Z0-9]*)\s*>')
+ENTITY_RE = re.compile(r'&(?:#([0-9]{1,7})|#[xX]([0-9a-fA-F]{1,6})|([a-zA-Z][a-zA-Z0-9]*));')
+NAME_RE = re.compile(r'[a-zA-Z0-9]*')
+TEXT_RE = re.compile(r'[^<&]+')
+INVALID_RE = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\ud800-\udfff\ufdd0-\ufdef\ufffe\uffff]')
+WHITESPACE_RE = re.compile(r'\s+')
+ESCAPE_RE = re.compile(r'[&<>]')
+ESCAPES = {u'&': u'&amp;', u'<': u'&lt;', u'>': u'&gt;'}
+
+
+def is_allowed(codepoint):
+	"""
+	True for the code points html5lib keeps as they are in a character reference.
+	"""
+	if codepoint in (0x09, 0x0a) or 0x20 <= codepoint < 0x7f:
+		return True
+	if codepoint < 0xa0 or 0xd800 <= codepoint < 0xe000 or 0xfdd0 <= codepoint < 0xfdf0:
+		return False
+	return codepoint <= min(sys.maxunicode, 0x10ffff) and codepoint & 0xfffe != 0xfffe
+
+
+def decode_reference(data, pos):
+	"""
+	Returns the text of the character reference starting at data[pos] and
+	the position after it. An '&' that does not start a reference is text.
+	"""
+	match = ENTITY_RE.match(data, pos)
+	if match:
+		number, hex_number, name = match.groups()
+		if name is not None:
+			if name not in name2codepoint or name in CHANGED_ENTITIES:
+				raise Unsupported('character reference &%s;' % name)
+			codepoint = name2codepoint[name]
+		elif number is not None:
+			codepoint = int(number)
+		else:
+			codepoint = int(hex_number, 16)
+		if not is_allowed(codepoint):
+			raise Unsupported('character reference %s' % match.group())
+		return unichr(codepoint), match.end()
+	if data.startswith(u'#', pos + 1):
+		raise Unsupported('malformed numeric character reference')
+	name = NAME_RE.match(data, pos + 1).group()
+	for length in range(1, min(len(name), 8) + 1):
+		if name[:length] in LEGACY_ENTITIES:
+			raise Unsupported('character reference without ; &%s' % name)
+	return u'&', pos + 1
+
+
+def decode_value(value):
+	parts = []
+	pos = 0
+	while True:
+		amp = value.find(u'&', pos)
+		if amp < 0:
+			parts.append(value[pos:])
+			return u''.join(parts)
+		parts.append(value[pos:amp])
+		text, pos = decode_reference(value, amp)
+		parts.append(text)
+
+
+def escape(text):
+	return ESCAPE_RE.sub(lambda match: ESCAPES[match.group()], text)
+
+
+def quote(value):
+	if u'"' not in value:
+		return u'"' + value + u'"'
+	if u"'" not in value:
+		return u"'" + value + u"'"
+	return u'"' + value.replace(u'"', u'&quot;') + u'"'
+
+
+def render_start_tag(name, attrs):
+	parts = [u'<', name]
+	for key in sorted(attrs):
+		parts.append(u' ' + key + u'=' + quote(escape(attrs[key])))
+	parts.append(u'/>' if name in VOID_ELEMENTS else u'>')
+	return u''.join(parts)
+
+
+def is_ascii(text):
+	try:
+		text.encode('ascii')
+	except UnicodeError:
+		return False
+	return True
+
+
+class Element(object):
+	"""
+	An open element. Inside a top level list that may get ids on its items
+	it also measures its contents the way tag_lib.has_enough_length does:
+	count and string stand for len(tag.contents) and tag.string, length is
+	the serialized size of the contents and raw_length the size of
+	''.join(str(child) for child in tag.contents).
+	"""
+	__slots__ = ('name', 'attrs', 'start_length', 'count', 'string', 'length', 'raw_length', 'raw_error')
+
+	def __init__(self, name, attrs):
+		self.name = name
+		self.attrs = attrs
+		self.start_length = 0
+		self.count = 0
+		self.string = None
+		self.length = 0
+		self.raw_length = 0
+		self.raw_error = False
+
+
+class ParagraphAnnotator(object):
+
+	def __init__(self, id_count):
+		self.id_count = id_count
+		self.out = []
+		self.text = []
+		self.stack = []
+		self.open_counts = {'a': 0, 'p': 0}
+		self.list = None
+		self.list_index = None
+		self.list_children = []
+		self.list_items = []
+
+	def next_id(self):
+		self.id_count += 1
+		return unicode(self.id_count)
+
+	def run(self, data):
+		if isinstance(data, str):
+			# html5lib guesses the encoding of byte strings
+			try:
+				data = data.decode('ascii')
+			except UnicodeError:
+				raise Unsupported('non ascii byte string')
+		data = data.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+		if INVALID_RE.search(data):
+			raise Unsupported('control or non character')
+		# html5lib drops the whitespace in front of the first token
+		data = data.lstrip(u' \t\n')
+		pos = 0
+		end = len(data)
+		while pos < end:
+			char = data[pos]
+			if char == u'<':
+				if data.startswith(u'</', pos):
+					match = END_TAG_RE.match(data, pos)
+					if match is None:
+						raise Unsupported('malformed end tag')
+					self.flush_text()
+					self.end_tag(match.group(1).lower())
+				else:
+					match = START_TAG_RE.match(data, pos)
+					if match is None:
+						raise Unsupported('malformed start tag')
+					self.flush_text()
+					name = match.group(1).lower()
+					self.start_tag(name, self.parse_attributes(name, match.group(2)), match.group(3))
+				pos = match.end()
+			elif char == u'&':
+				text, pos = decode_reference(data, pos)
+				self.text.append(text)
+			else:
+				match = TEXT_RE.match(data, pos)
+				self.text.append(match.group())
+				pos = match.end()
+		self.flush_text()
+		if self.stack:
+			raise Unsupported('unclosed <%s>' % self.stack[-1].name)
+		content = u''.join(self.out).encode('utf-8').replace('\xc2\xa0', ' ')
+		return content, self.id_count
+
+	def parse_attributes(self, name, source):
+		attrs = {}
+		list_attributes = LINK_LIST_ATTRIBUTES if name == 'a' else LIST_ATTRIBUTES
+		for match in ATTRIBUTE_RE.finditer(source):
+			key = match.group(1).lower()
+			if key in attrs:
+				raise Unsupported('duplicate attribute %s' % key)
+			value = match.group(2)
+			if value is None:
+				value = match.group(3)
+			if value is None:
+				value = match.group(4) or u''
+			if u'&' in value:
+				value = decode_value(value)
+			if key in list_attributes:
+				value = WHITESPACE_RE.sub(u' ', value)
+			attrs[key] = value
+		return attrs
+
+	def start_tag(self, name, attrs, self_closing):
+		if name not in ELEMENTS:
+			raise Unsupported('element <%s>' % name)
+		if self_closing and name not in VOID_ELEMENTS:
+			raise Unsupported('self closing <%s/>' % name)
+		if name in CLOSES_P and self.open_counts['p']:
+			raise Unsupported('<%s> inside <p>' % name)
+		if name == 'a' and self.open_counts['a']:
+			raise Unsupported('<a> inside <a>')
+		if name in HEADINGS and self.stack and self.stack[-1].name in HEADINGS:
+			raise Unsupported('<%s> inside <%s>' % (name, self.stack[-1].name))
+		if name == 'li':
+			for element in reversed(self.stack):
+				if element.name == 'li':
+					raise Unsupported('<li> inside <li>')
+				if element.name in LIST_ITEM_SCOPE:
+					break
+
+		element = Element(name, attrs)
+		top_level = not self.stack
+		out_attrs = attrs
+		if name in STYLED_ELEMENTS:
+			out_attrs = dict(attrs, style=u' ')
+		if top_level and name in ('p', 'img') and 'id' not in attrs:
+			out_attrs = dict(out_attrs, id=self.next_id())
+
+		index = len(self.out)
+		self.out.append(render_start_tag(name, out_attrs))
+		if self.list is not None:
+			element.start_length = len(render_start_tag(name, attrs).encode('utf-8'))
+			if self.stack[-1] is self.list and name == 'li' and 'id' not in attrs:
+				self.list_items.append((index, out_attrs))
+		elif top_level and name in LIST_ELEMENTS and 'id' not in attrs:
+			self.list = element
+			self.list_index = index
+			self.list_children = []
+			self.list_items = []
+
+		if name in VOID_ELEMENTS:
+			self.closed(element)
+		else:
+			self.stack.append(element)
+			if name in self.open_counts:
+				self.open_counts[name] += 1
+
+	def end_tag(self, name):
+		if not self.stack or self.stack[-1].name != name:
+			raise Unsupported('misnested </%s>' % name)
+		element = self.stack.pop()
+		if name in self.open_counts:
+			self.open_counts[name] -= 1
+		self.out.append(u'</' + name + u'>')
+		self.closed(element)
+
+	def closed(self, element):
+		if self.list is None:
+			return
+		if element is self.list:
+			self.finish_list()
+			return
+		string = element.string if element.count == 1 else None
+		length = element.start_length + element.length
+		if element.name not in VOID_ELEMENTS:
+			length += len(element.name) + 3
+		parent = self.stack[-1]
+		if parent is self.list:
+			self.list_children.append((string, element.raw_length, element.raw_error))
+			return
+		parent.count += 1
+		parent.string = string
+		parent.length += length
+		parent.raw_length += length
+
+	def flush_text(self):
+		if not self.text:
+			return
+		text = u''.join(self.text)
+		self.text = []
+		if not self.stack:
+			# BeautifulSoup writes top level text with str(), unescaped
+			if not is_ascii(text):
+				raise Unsupported('non ascii text at the top level')
+			self.out.append(text)
+			return
+		escaped = escape(text)
+		self.out.append(escaped)
+		if self.list is None:
+			return
+		parent = self.stack[-1]
+		if parent is self.list:
+			self.list_children.append((text, 0, False))
+			return
+		parent.count += 1
+		parent.string = text
+		parent.length += len(escaped.encode('utf-8'))
+		if is_ascii(text):
+			parent.raw_length += len(text)
+		else:
+			parent.raw_error = True
+
+	def finish_list(self):
+		eligible = False
+		for string, raw_length, raw_error in self.list_children:
+			if string is not None:
+				eligible = len(string) > 100
+			elif raw_error:
+				# str() of the item text raises UnicodeEncodeError in the soup implementation
+				raise Unsupported('non ascii text directly inside a list item')
+			else:
+				eligible = raw_length > 100
+			if eligible:
+				break
+		if eligible:
+			for index, attrs in self.list_items:
+				self.out[index] = render_start_tag('li', dict(attrs, id=self.next_id()))
+		else:
+			self.out[self.list_index] = render_start_tag(self.list.name,
+														dict(self.list.attrs, id=self.next_id()))
+		self.list = None
+
+
+def annotate(data, id_count):
+	"""
+	Returns (content, id_count) for data like tag_lib.insert_tag_id_soup.
+	Raises Unsupported for markup that has to go through BeautifulSoup.
+	"""
+	return ParagraphAnnotator(id_count).run(data)
@@ -0,0 +1,150 @@
+"""
+Maintenance of the ArchiveCount table and date ranges of the archive pages.
+
+A live post counts in the month of its publication_start. Counts are changed
+incrementally when posts go live, are unpublished, are moved to another month
+or are deleted. Bulk operations which bypass the signals apply their deltas
+with apply_archive_deltas(), and rebuild_archive_counts() recomputes everything.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from blogging.models import ArchiveCount, BlogContent
+
+
+def get_bucket(value):
+	"""
+	Returns the (year, month) of the datetime value in the current time zone.
+	"""
+	if value is None:
+		return None
+	if settings.USE_TZ and timezone.is_aware(value):
+		value = timezone.localtime(value)
+	return value.year, value.month
+
+
+def get_post_bucket(post):
+	"""
+	Returns the bucket post counts in, or None when it is not live.
+	"""
+	if not post.is_live:
+		return None
+	return get_bucket(post.publication_start)
+
+
+def apply_archive_deltas(deltas):
+	"""
+	deltas maps (year, month) to the change of the count.
+	"""
+	for (year, month), delta in deltas.items():
+		if not delta:
+			continue
+		updated = ArchiveCount.objects.filter(year=year, month=month).update(count=F('count') + delta)
+		if not updated and delta > 0:
+			ArchiveCount.objects.create(year=year, month=month, count=delta)
+
+
+def add_post(deltas, post, delta=1):
+	bucket = get_post_bucket(post)
+	if bucket is not None:
+		deltas[bucket] = deltas.get(bucket, 0) + delta
+
+
+def rebuild_archive_counts(chunk_size=2000):
+	"""
+	Recompute all the counts. Dates are bucketed in python so that months
+	follow the current time zone on every database.
+	"""
+	counts = {}
+	dates = BlogContent.published.order_by().values_list('publication_start', flat=True)
+	for value in dates.iterator():
+		bucket = get_bucket(value)
+		counts[bucket] = counts.get(bucket, 0) + 1
+	ArchiveCount.objects.all().delete()
+	ArchiveCount.objects.bulk_create([ArchiveCount(year=year, month=month, count=count)
+									  for (year, month), count in counts.items()], batch_size=chunk_size)
+
+
+def get_months(year=None):
+	"""
+	Returns the ArchiveCount rows with posts, newest first, of year or of all years.
+	"""
+	months = ArchiveCount.objects.filter(count__gt=0)
+	if year is not None:
+		months = months.filter(year=year)
+	return list(months)
+
+
+def get_years():
+	"""
+	Returns (year, count, months) tuples, newest first, for the archive widget.
+	"""
+	years = []
+	for month in get_months():
+		if not years or years[-1][0] != month.year:
+			years.append((month.year, 0, []))
+		year, count, months = years[-1]
+		years[-1] = (year, count + month.count, months + [month])
+	return years
+
+
+def get_range(year, month=None, day=None):
+	"""
+	Returns the [start, end) datetimes of the period, in the current time
+	zone. Raises ValueError for dates that do not exist.
+	"""
+	if day is not None:
+		start = datetime.datetime(year, month, day)
+		end = start + datetime.timedelta(days=1)
+	elif month is not None:
+		start = datetime.datetime(year, month, 1)
+		end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+	else:
+		start = datetime.datetime(year, 1, 1)
+		end = datetime.datetime(year + 1, 1, 1)
+	if settings.USE_TZ:
+		start = timezone.make_aware(start, timezone.get_current_timezone())
+		end = timezone.make_aware(end, timezone.get_current_timezone())
+	return start, end
+
+
+def remember_post_state(sender, instance, **kwargs):
+	# __dict__ is used so that deferred fields are not loaded
+	state = instance.__dict__
+	if 'is_live' not in state:
+		return
+	if not state['is_live']:
+		instance._archive_state = None
+	elif 'publication_start' in state:
+		instance._archive_state = get_bucket(state['publication_start'])
+
+
+def post_saved(sender, instance, created, raw=False, **kwargs):
+	if raw:
+		return
+	bucket = get_post_bucket(instance)
+	if created:
+		old_bucket = None
+	elif hasattr(instance, '_archive_state'):
+		old_bucket = instance._archive_state
+	else:
+		# is_live was deferred when the post was loaded, the old state is unknown
+		return
+	instance._archive_state = bucket
+	if bucket == old_bucket:
+		return
+	deltas = {}
+	if old_bucket is not None:
+		deltas[old_bucket] = -1
+	if bucket is not None:
+		deltas[bucket] = deltas.get(bucket, 0) + 1
+	apply_archive_deltas(deltas)
+
+
+def post_deleted(sender, instance, **kwargs):
+	bucket = getattr(instance, '_archive_state', None)
+	if bucket is not None:
+		apply_archive_deltas({bucket: -1})
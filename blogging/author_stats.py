@@ -0,0 +1,75 @@
+"""
+Maintenance of the AuthorStats table.
+
+The row of an author is recomputed whenever one of their posts goes live, is
+unpublished, is moved in time, changes author or is deleted. Recomputing
+reads only the live posts of that author through the (author_id,
+publication_start) index, and gives the right latest publication time also
+when the latest post is the one removed. Bulk operations which bypass the
+signals call update_author_stats() with the authors they touch, and
+rebuild_author_stats() recomputes everything.
+"""
+from django.db.models import Count, Max
+
+from blogging.models import AuthorStats, BlogContent
+
+
+def update_author_stats(author_ids):
+	for author_id in set(author_ids):
+		stats = BlogContent.published.filter(author_id=author_id).order_by().aggregate(
+			post_count=Count('id'), last_published=Max('publication_start'))
+		updated = AuthorStats.objects.filter(author=author_id).update(**stats)
+		if not updated and stats['post_count']:
+			AuthorStats.objects.create(author_id=author_id, **stats)
+
+
+def rebuild_author_stats():
+	rows = (BlogContent.published.order_by()
+							.values('author_id')
+							.annotate(post_count=Count('id'), last_published=Max('publication_start')))
+	AuthorStats.objects.all().delete()
+	AuthorStats.objects.bulk_create([AuthorStats(author_id=row['author_id'], post_count=row['post_count'],
+												 last_published=row['last_published']) for row in rows])
+
+
+def get_state(instance):
+	"""
+	Returns what the stats of the post author depend on, or None when a part
+	of it is deferred.
+	"""
+	state = instance.__dict__
+	if 'is_live' not in state or 'author_id_id' not in state:
+		return None
+	if not state['is_live']:
+		return False, state['author_id_id'], None
+	if 'publication_start' not in state:
+		return None
+	return True, state['author_id_id'], state['publication_start']
+
+
+def remember_post_state(sender, instance, **kwargs):
+	# __dict__ is used so that deferred fields are not loaded
+	instance._author_stats_state = get_state(instance)
+
+
+def post_saved(sender, instance, created, raw=False, **kwargs):
+	if raw:
+		return
+	old_state = getattr(instance, '_author_stats_state', None)
+	state = get_state(instance)
+	instance._author_stats_state = state
+	if created:
+		if instance.is_live:
+			update_author_stats([instance.author_id_id])
+		return
+	if state is not None and state == old_state:
+		return
+	author_ids = [instance.author_id_id]
+	if old_state is not None:
+		author_ids.append(old_state[1])
+	update_author_stats(author_ids)
+
+
+def post_deleted(sender, instance, **kwargs):
+	if instance.author_id_id is not None:
+		update_author_stats([instance.author_id_id])
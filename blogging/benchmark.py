@@ -0,0 +1,228 @@
+"""
+Benchmark of the public blogging views on a generated corpus.
+
+build_corpus() fills the database with a section tree, posts, tags and
+revisions of a configurable size, get_scenarios() picks the urls to request
+for every view and run_scenario() times them with the test client, counting
+queries. Used by the benchmark_views command, which runs it in a test
+database.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.template import RequestContext
+from django.utils import timezone
+
+from blogging.importer import import_posts
+from blogging.models import BlogContent, BlogContentType, BlogContentTypeField, BlogParent
+from blogging.registry import content_types_changed
+from blogging.tree import get_tree
+from blogging.utils import create_content_type
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+		'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex '
+		'ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla').split()
+
+
+class CorpusSpec(object):
+	"""
+	Size of the generated corpus. A tree of depth sections below each of
+	breadth roots, breadth children per section, posts_per_section posts in
+	every leaf section.
+	"""
+
+	def __init__(self, depth=2, breadth=3, posts_per_section=20, paragraphs=12, tags_per_post=3,
+				tag_pool=50, revisions=1, seed=1):
+		self.depth = depth
+		self.breadth = breadth
+		self.posts_per_section = posts_per_section
+		self.paragraphs = paragraphs
+		self.tags_per_post = tags_per_post
+		self.tag_pool = tag_pool
+		self.revisions = revisions
+		self.seed = seed
+
+	def as_dict(self):
+		return dict(self.__dict__)
+
+
+def make_text(rng, words):
+	return ' '.join(rng.choice(WORDS) for i in range(words)).capitalize() + '.'
+
+
+def make_article(rng, paragraphs):
+	parts = []
+	for i in range(paragraphs):
+		parts.append('<p><span style="font-size:14px">%s <strong>%s</strong> %s</span></p>\n' % (
+			make_text(rng, 40), make_text(rng, 4), make_text(rng, 30)))
+		if i % 4 == 3:
+			parts.append('<ul>\n<li>%s</li>\n<li>%s</li>\n</ul>\n' % (make_text(rng, 25), make_text(rng, 5)))
+	return ''.join(parts)
+
+
+def build_corpus(spec):
+	"""
+	Creates the corpus described by spec. Returns the number of posts.
+	"""
+	rng = random.Random(spec.seed)
+	User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+	section_type = BlogContentType.objects.create(content_type='BenchmarkSection', is_leaf=False)
+	create_content_type(section_type, [('Body', 'TextField')])
+	post_type = BlogContentType.objects.create(content_type='BenchmarkArticle', is_leaf=True)
+	create_content_type(post_type, [('Body', 'TextField')])
+	content_types_changed(BlogContentTypeField)
+	BlogParent.objects.create(title='Orphan', data='', content_type=section_type)
+
+	leaves = []
+
+	def add_sections(parent, prefix, level):
+		for i in range(spec.breadth):
+			title = '%s%d' % (prefix, i + 1)
+			section = BlogParent(title='Section ' + title, parent=parent, content_type=section_type,
+								data='%% Body_tag %% <p>' + make_text(rng, 30) + '</p>%% endtag Body_tag %%')
+			section.save()
+			if level < spec.depth:
+				add_sections(section, title + '.', level + 1)
+			else:
+				leaves.append(section)
+	add_sections(None, '', 0)
+
+	tags = ['tag-%d' % i for i in range(spec.tag_pool)]
+	now = timezone.now()
+
+	def entries():
+		count = 0
+		for section in leaves:
+			for i in range(spec.posts_per_section):
+				count += 1
+				yield {
+					'content_type': post_type.content_type,
+					'section': section.path,
+					'title': make_text(rng, 6)[:100],
+					'fields': {'Body': make_article(rng, spec.paragraphs)},
+					'author': 'benchmark',
+					'tags': rng.sample(tags, min(spec.tags_per_post, len(tags))),
+					'publication_start': now - timedelta(hours=count),
+				}
+	count = import_posts(entries())
+
+	if spec.revisions and 'reversion' in settings.INSTALLED_APPS:
+		import reversion
+		for post in BlogContent.objects.all():
+			for i in range(spec.revisions):
+				with reversion.create_revision():
+					post.save()
+	return count
+
+
+def get_plugin_scenarios():
+	"""
+	Returns (name, callable) pairs rendering the blogging CMS plugins.
+	"""
+	if 'cms' not in settings.INSTALLED_APPS:
+		return []
+	from cms.models import Placeholder
+	from blogging.models import LatestEntriesPlugin, SectionPlugin
+	placeholder = Placeholder.objects.create(slot='benchmark')
+	latest = LatestEntriesPlugin.objects.create(placeholder=placeholder, plugin_type='LatestEntriesPlugin',
+											language=settings.LANGUAGE_CODE, position=0, latest_entries=10)
+	sections = SectionPlugin.objects.create(placeholder=placeholder, plugin_type='SectionPlugin',
+											language=settings.LANGUAGE_CODE, position=1)
+	factory = RequestFactory()
+
+	def render(instance):
+		def call():
+			request = factory.get('/')
+			request.user = AnonymousUser()
+			instance.render_plugin(RequestContext(request), placeholder)
+		return call
+	return [('plugin_latest_entries', [render(latest)]), ('plugin_sections', [render(sections)])]
+
+
+def get_scenarios(samples=10, seed=1):
+	"""
+	Returns (name, requests) pairs. A request is a url to GET or a callable.
+	"""
+	rng = random.Random(seed)
+	tree = get_tree()
+	leaf_sections = []
+	parent_sections = []
+	for section in BlogParent.objects.exclude(title='Orphan'):
+		node = tree.get(section.pk)
+		(leaf_sections if node.is_leaf_node() else parent_sections).append(node.get_absolute_url())
+	posts = [reverse('blogging:teaser-view', kwargs={'slug': url_path})
+			for url_path in BlogContent.objects.order_by('?').values_list('url_path', flat=True)[:samples]]
+	tags = ['tag-%d' % i for i in range(samples)]
+
+	def sample(items):
+		return rng.sample(items, min(samples, len(items)))
+
+	scenarios = [
+		('index', [reverse('blogging:section-view')]),
+		('teaser_leaf', sample(leaf_sections)),
+		('teaser_nonleaf', sample(parent_sections)),
+		('teaser_detail', posts),
+		('tagged_post', [reverse('blogging:tagged-posts', kwargs={'tag': tag}) for tag in tags]),
+	]
+	return [scenario for scenario in scenarios if scenario[1]] + get_plugin_scenarios()
+
+
+def percentile(values, fraction):
+	"""
+	Nearest rank percentile of the sorted list values.
+	"""
+	if not values:
+		return None
+	index = max(0, int(math.ceil(fraction * len(values))) - 1)
+	return values[index]
+
+
+def run_scenario(requests, repeat, client=None):
+	"""
+	Times every request of the scenario repeat times, after one warm up
+	round. Returns latency percentiles in milliseconds and query counts.
+	"""
+	client = client or Client()
+
+	def call(item):
+		if callable(item):
+			item()
+			return 200
+		return client.get(item).status_code
+
+	for item in requests:
+		call(item)
+	times = []
+	queries = []
+	errors = 0
+	for i in range(repeat):
+		for item in requests:
+			with CaptureQueriesContext(connection) as context:
+				start = time.time()
+				status = call(item)
+				times.append((time.time() - start) * 1000)
+			queries.append(len(context.captured_queries))
+			if status != 200:
+				errors += 1
+	times.sort()
+	queries.sort()
+	return {
+		'requests': len(times),
+		'errors': errors,
+		'mean_ms': round(sum(times) / len(times), 2),
+		'min_ms': round(times[0], 2),
+		'p50_ms': round(percentile(times, 0.5), 2),
+		'p90_ms': round(percentile(times, 0.9), 2),
+		'p99_ms': round(percentile(times, 0.99), 2),
+		'max_ms': round(times[-1], 2),
+		'queries_p50': percentile(queries, 0.5),
+		'queries_max': queries[-1],
+	}
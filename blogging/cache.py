@@ -0,0 +1,221 @@
+"""
+Page cache for the public blogging views.
+
+Cached pages are keyed on the request path and on a content version, which is
+bumped whenever a post, a section or the tags of a post change. Bumping the
+version makes every page cached before it unreachable, so nothing has to be
+deleted explicitly. The cache is the `default` Django cache.
+
+The content resolved by CMS plugins is cached the same way, keyed on the
+plugin instance and its last change.
+
+conditional_page answers 304 Not Modified to requests whose ETag or
+Last-Modified validators are still current, before the view renders anything.
+
+Versions bumped inside an atomic() block are only bumped once its transaction
+is committed. Bumped earlier, a concurrent request could read the new version,
+render from the data not committed yet and cache it under that version.
+
+Settings:
+	BLOGGING_PAGE_CACHE -- enable the page and plugin caches (default True).
+	BLOGGING_PAGE_CACHE_TIMEOUT -- seconds a page is kept (default 600).
+"""
+import calendar
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+CONTENT_VERSION_KEY = 'blogging:content-version'
+
+_pending = threading.local()
+
+
+def get_version(key):
+	"""
+	Returns the version counter stored under key, shared by all processes.
+	"""
+	version = cache.get(key)
+	if version is None:
+		cache.add(key, 1, None)
+		version = cache.get(key, 1)
+	return version
+
+
+def bump_version(key):
+	keys = getattr(_pending, 'keys', None)
+	if keys is not None:
+		keys.add(key)
+		return None
+	try:
+		return cache.incr(key)
+	except ValueError:
+		# key missing or evicted, any new value invalidates what used the old one
+		get_version(key)
+		return cache.incr(key)
+
+
+def is_bump_pending(key):
+	"""
+	Returns True when key was bumped inside the current atomic() block, whose
+	changes other processes do not see yet.
+	"""
+	return key in (getattr(_pending, 'keys', None) or ())
+
+
+@contextmanager
+def bumps_after_commit():
+	"""
+	Runs the block in transaction.atomic() and bumps the versions bumped in it
+	once the transaction is committed. Nothing is bumped when the block raises.
+	Nested blocks leave the bumps to the outermost one, which commits unless it
+	is itself inside another transaction.
+	"""
+	if getattr(_pending, 'keys', None) is not None:
+		with transaction.atomic():
+			yield
+		return
+	_pending.keys = set()
+	try:
+		with transaction.atomic():
+			yield
+		keys = _pending.keys
+	finally:
+		_pending.keys = None
+	for key in keys:
+		bump_version(key)
+
+
+def atomic(func):
+	"""
+	Decorator running func in bumps_after_commit().
+	"""
+	@wraps(func)
+	def wrapper(*args, **kwargs):
+		with bumps_after_commit():
+			return func(*args, **kwargs)
+	return wrapper
+
+
+def get_content_version():
+	return get_version(CONTENT_VERSION_KEY)
+
+
+def bump_content_version():
+	return bump_version(CONTENT_VERSION_KEY)
+
+
+def content_changed(sender, **kwargs):
+	"""
+	Signal receiver for saves and deletes of the blogging content.
+	"""
+	bump_content_version()
+
+
+def get_page_key(request, version=None):
+	if version is None:
+		version = get_content_version()
+	path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+	return 'blogging:page:%s:%s' % (version, path)
+
+
+def get_plugin_key(instance, name):
+	changed = getattr(instance, 'changed_date', None)
+	changed = changed.strftime('%Y%m%d%H%M%S%f') if changed else ''
+	return 'blogging:plugin:%s:%s:%s:%s' % (get_content_version(), instance.pk, changed, name)
+
+
+def cached_plugin_value(instance, name, build):
+	"""
+	Returns the value named name of the plugin instance, calling build() to
+	compute it when it is not cached yet. The value must be picklable.
+	"""
+	if not getattr(settings, 'BLOGGING_PAGE_CACHE', True) or instance.pk is None:
+		return build()
+	key = get_plugin_key(instance, name)
+	value = cache.get(key)
+	if value is None:
+		value = build()
+		cache.set(key, value, getattr(settings, 'BLOGGING_PAGE_CACHE_TIMEOUT', 600))
+	return value
+
+
+def cached_page(view):
+	"""
+	Cache the successful responses of view for anonymous GET requests.
+	"""
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		user = getattr(request, 'user', None)
+		if not getattr(settings, 'BLOGGING_PAGE_CACHE', True) or \
+				request.method not in ('GET', 'HEAD') or (user is not None and user.is_authenticated()):
+			return view(request, *args, **kwargs)
+
+		key = get_page_key(request)
+		page = cache.get(key)
+		if page is not None:
+			content, content_type = page
+			return HttpResponse(content, content_type=content_type)
+
+		response = view(request, *args, **kwargs)
+		if response.status_code == 200 and not response.streaming:
+			timeout = getattr(settings, 'BLOGGING_PAGE_CACHE_TIMEOUT', 600)
+			cache.set(key, (response.content, response['Content-Type']), timeout)
+		return response
+	return wrapper
+
+
+def not_modified(request, etag=None, last_modified=None):
+	"""
+	Returns True when the client copy is current: its If-None-Match lists etag
+	(an unquoted value) or, without If-None-Match, its If-Modified-Since is not
+	older than last_modified (a timestamp).
+	"""
+	if request.method not in ('GET', 'HEAD'):
+		return False
+	if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+	if if_none_match:
+		return bool(etag) and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match))
+	if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+	return bool(last_modified and if_modified_since) and int(last_modified) <= if_modified_since
+
+
+def conditional_page(get_validators):
+	"""
+	Answer anonymous GET requests with 304 Not Modified when the client copy
+	is current, without calling the view. get_validators(request, *args,
+	**kwargs) returns an (etag, last modified datetime or None) pair computed
+	cheaply before rendering, or None for requests it does not handle. The
+	etag is combined with the request path, and 200 responses carry both
+	validators.
+	"""
+	def decorator(view):
+		@wraps(view)
+		def wrapper(request, *args, **kwargs):
+			user = getattr(request, 'user', None)
+			if request.method not in ('GET', 'HEAD') or (user is not None and user.is_authenticated()):
+				return view(request, *args, **kwargs)
+			validators = get_validators(request, *args, **kwargs)
+			if validators is None:
+				return view(request, *args, **kwargs)
+			etag, last_modified = validators
+			etag = hashlib.md5(('%s:%s' % (etag, request.get_full_path())).encode('utf-8')).hexdigest()
+			timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+			if not_modified(request, etag, timestamp):
+				response = HttpResponseNotModified()
+			else:
+				response = view(request, *args, **kwargs)
+				if response.status_code != 200:
+					return response
+			response['ETag'] = quote_etag(etag)
+			if timestamp:
+				response['Last-Modified'] = http_date(timestamp)
+			return response
+		return wrapper
+	return decorator
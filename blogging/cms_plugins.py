@@ -5,6 +5,9 @@ from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 from blogging import models
 from blogging.forms import LatestEntriesForm, SectionPluginForm, ContactForm
+from blogging.pagination import paginate, KeysetPage
+from blogging.cache import cached_plugin_value
+from blogging.timing import timed
 from django.core.mail import send_mail, mail_admins
 
 class BlogPlugin(CMSPluginBase):
@@ -19,19 +22,44 @@ class LatestEntriesPlugin(BlogPlugin):
     model = models.LatestEntriesPlugin
     form = LatestEntriesForm
 
+    @timed('plugins')
     def render(self, context, instance, placeholder):
         if instance and instance.template:
             self.render_template = instance.template
         context['instance'] = instance
-#	context['nodes'] = self.model.get_post()
+        request = context.get('request')
+        if request is not None:
+            context['pagination'] = self.get_pagination(instance, request)
+            context['nodes'] = context['pagination'].object_list
+        else:
+            context['nodes'] = instance.get_posts()
         return context
 
+    def get_pagination(self, instance, request):
+        """
+        The first page, shown on every render of the CMS page, is cached until
+        the posts or the plugin change. Older pages are fetched on demand.
+        """
+        prefix = '%d-' % instance.pk
+        if prefix + 'after' in request.GET or prefix + 'before' in request.GET:
+            return paginate(instance.get_post_queryset(), request, instance.latest_entries, prefix)
+
+        def first_page():
+            page = paginate(instance.get_post_queryset(), request, instance.latest_entries, prefix)
+            return page.object_list, page.has_next
+        posts, has_next = cached_plugin_value(instance, 'first-page', first_page)
+        return KeysetPage(posts, request, prefix, has_next, False)
+
 class SectionPlugin(BlogPlugin):
     render_template = 'blogging/plugin/plugin_section.html'
     name = _(' Blog Section Plugin ')
     model = models.SectionPlugin
     form = SectionPluginForm
 
+    @timed('plugins')
+    def render(self, context, instance, placeholder):
+        return super(SectionPlugin, self).render(context, instance, placeholder)
+
 class ContactPlugin(BlogPlugin):
     render_template = 'blogging/plugin/plugin_contact.html'
     name = _(' Contact Plugin ')
@@ -52,6 +80,8 @@ class ContactPlugin(BlogPlugin):
         else:
             print "Contact form inside get"
             return ContactForm(initial={'contact_type':contact_type})    
+
+    @timed('plugins')
     def render(self, context, instance, placeholder):
         request = context['request']
 
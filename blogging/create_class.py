@@ -41,9 +41,10 @@ class CreateClass():
     
         self.class_strfunction_string += '\t\treturn "' + self.class_name + '"\n\n'
         
+        self.class_templatefuntion_string += '\t\tfields = tag_lib.parse_fields(db_object,self.tag_list)\n'
         self.class_templatefuntion_string += '\t\tfor tag_name in self.tag_list:\n'
         self.class_templatefuntion_string += '\t\t\tcurrent_field = tag_lib.get_field_name_from_tag(str(tag_name[\'name\']))\n'
-        self.class_templatefuntion_string += '\t\t\tresult_field = tag_lib.parse_content(db_object,tag_name)\n'
+        self.class_templatefuntion_string += '\t\t\tresult_field = fields[str(tag_name[\'name\'])]\n'
         
         self.class_dbfuntion_string += '\t\ttemp_data = ""\n'
         self.class_dbfuntion_string += '\t\tfor tag_name in self.tag_list:\n'
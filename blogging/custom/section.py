@@ -20,9 +20,10 @@ class Section(models.Model):
 		return "Section"
 
 	def render_to_template(self,db_object):
+		fields = tag_lib.parse_fields(db_object,self.tag_list)
 		for tag_name in self.tag_list:
 			current_field = tag_lib.get_field_name_from_tag(str(tag_name['name']))
-			result_field = tag_lib.parse_content(db_object,tag_name)
+			result_field = fields[str(tag_name['name'])]
 			if current_field == 'Body' : 
 				self.Body = result_field 
 
@@ -0,0 +1,238 @@
+"""
+RSS and Atom feeds of the latest posts of the site, of a section with its
+subsections and of a tag.
+
+A rendered feed is cached under the versions of its scopes. The versions of
+the site, of the section of a post with its ancestors and of the tags of the
+post are bumped when a live post is saved or deleted. Every feed also depends
+on the tree version, since section paths are part of the post urls, so a feed
+is rendered again only once a post it lists or its url has changed. The
+versions also make the ETag, and the publication time of the newest post the
+Last-Modified header, so that polling feed readers mostly get 304 responses.
+
+Settings:
+	BLOGGING_FEED_SIZE -- number of posts in a feed (default 20).
+	BLOGGING_FEED_CACHE_TIMEOUT -- seconds a rendered feed is kept (default one day).
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe, quote_etag
+from taggit.models import Tag, TaggedItem
+
+from blogging.cache import get_version, bump_version, not_modified
+from blogging.models import BlogContent
+from blogging.tree import get_tree, TREE_VERSION_KEY
+
+FEED_VERSION_KEY = 'blogging:feed-version:%s'
+SITE_SCOPE = 'site'
+
+
+def section_scope(section_id):
+	return 'section:%d' % section_id
+
+
+def tag_scope(name):
+	return 'tag:%s' % hashlib.md5(name.encode('utf-8')).hexdigest()
+
+
+def bump_scopes(section_ids=(), tag_names=()):
+	"""
+	Invalidates the site feeds and the feeds of the given sections, their
+	ancestors and the given tags.
+	"""
+	scopes = set([SITE_SCOPE])
+	tree = get_tree()
+	for section_id in section_ids:
+		if section_id is None:
+			continue
+		scopes.add(section_scope(section_id))
+		node = tree.get(section_id)
+		if node is not None:
+			scopes.update(section_scope(ancestor) for ancestor in node.ancestor_ids)
+	scopes.update(tag_scope(name) for name in tag_names)
+	for scope in scopes:
+		bump_version(FEED_VERSION_KEY % scope)
+
+
+def get_post_tag_names(post_id):
+	return list(TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(BlogContent),
+										  object_id=post_id).values_list('tag__name', flat=True))
+
+
+def remember_post_state(sender, instance, **kwargs):
+	# __dict__ is used so that deferred fields are not loaded
+	instance._feed_state = (instance.__dict__.get('is_live', True), instance.__dict__.get('section_id'))
+
+
+def post_changed(sender, instance, **kwargs):
+	"""
+	Signal receiver for saves and deletes of posts.
+	"""
+	if kwargs.get('raw'):
+		return
+	was_live, old_section_id = getattr(instance, '_feed_state', (True, None))
+	instance._feed_state = (instance.is_live, instance.section_id)
+	if not was_live and not instance.is_live:
+		return
+	bump_scopes([instance.section_id, old_section_id], get_post_tag_names(instance.pk))
+
+
+def tagged_item_changed(sender, instance, **kwargs):
+	"""
+	Signal receiver for saves and deletes of tagged items.
+	"""
+	if kwargs.get('raw') or instance.content_type_id != ContentType.objects.get_for_model(BlogContent).id:
+		return
+	section_ids = BlogContent.published.filter(pk=instance.object_id).values_list('section', flat=True)
+	tag_names = Tag.objects.filter(pk=instance.tag_id).values_list('name', flat=True)
+	bump_scopes(list(section_ids), list(tag_names))
+
+
+class PostFeed(Feed):
+	"""
+	Feed of the latest live posts, cached as described in the module
+	documentation. Subclasses select the posts and the versions they are cached under.
+	"""
+	title = 'Latest posts'
+	description = 'Latest posts of the blog'
+
+	def get_version_keys(self, **kwargs):
+		# the tree version covers the post urls changed by moved or renamed sections
+		return [TREE_VERSION_KEY, FEED_VERSION_KEY % SITE_SCOPE]
+
+	def get_posts(self, obj):
+		return BlogContent.published.listing()
+
+	def link(self, obj):
+		return reverse('blogging:section-view')
+
+	def items(self, obj):
+		size = getattr(settings, 'BLOGGING_FEED_SIZE', 20)
+		return self.get_posts(obj).order_by('-publication_start', '-id')[:size]
+
+	def item_title(self, item):
+		return item.title
+
+	def item_description(self, item):
+		return item.summary
+
+	def item_link(self, item):
+		return reverse('blogging:teaser-view', kwargs={'slug': item.url_path})
+
+	def item_pubdate(self, item):
+		return item.publication_start
+
+	def item_author_name(self, item):
+		return item.author_id.get_full_name() or item.author_id.username
+
+	def item_categories(self, item):
+		return [tag['name'] for tag in item.get_tags()]
+
+	def get_cache_key(self, request, version_keys):
+		versions = '.'.join(str(get_version(version_key)) for version_key in version_keys)
+		path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+		return 'blogging:feed:%s:%s' % (versions, path)
+
+	def __call__(self, request, *args, **kwargs):
+		if not getattr(settings, 'BLOGGING_PAGE_CACHE', True):
+			return super(PostFeed, self).__call__(request, *args, **kwargs)
+		key = self.get_cache_key(request, self.get_version_keys(**kwargs))
+		etag = hashlib.md5(key.encode('utf-8')).hexdigest()
+		feed = cache.get(key)
+		if feed is None:
+			response = super(PostFeed, self).__call__(request, *args, **kwargs)
+			feed = (response.content, response['Content-Type'], response.get('Last-Modified'))
+			cache.set(key, feed, getattr(settings, 'BLOGGING_FEED_CACHE_TIMEOUT', 86400))
+		content, content_type, last_modified = feed
+		if not_modified(request, etag, parse_http_date_safe(last_modified or '')):
+			response = HttpResponseNotModified()
+		else:
+			response = HttpResponse(content, content_type=content_type)
+		response['ETag'] = quote_etag(etag)
+		if last_modified:
+			response['Last-Modified'] = last_modified
+		return response
+
+
+class SectionFeed(PostFeed):
+	"""
+	Latest posts of a section and of its subsections.
+	"""
+
+	def get_section(self, slug):
+		section = get_tree().get_by_path(slug)
+		if section is None:
+			raise Http404
+		return section
+
+	def get_version_keys(self, slug):
+		# the tree version covers sections moved in or out of the subtree
+		return [TREE_VERSION_KEY, FEED_VERSION_KEY % section_scope(self.get_section(slug).id)]
+
+	def get_object(self, request, slug):
+		return self.get_section(slug)
+
+	def get_posts(self, obj):
+		section_ids = get_tree().get_descendant_ids(obj.id, include_self=True)
+		return BlogContent.published.listing().filter(section__in=section_ids)
+
+	def title(self, obj):
+		return obj.title
+
+	def description(self, obj):
+		return 'Latest posts in %s' % obj.title
+
+	def link(self, obj):
+		return obj.get_absolute_url()
+
+
+class TagFeed(PostFeed):
+	"""
+	Latest posts tagged with a tag.
+	"""
+
+	def get_version_keys(self, tag):
+		return [TREE_VERSION_KEY, FEED_VERSION_KEY % tag_scope(tag)]
+
+	def get_object(self, request, tag):
+		if not Tag.objects.filter(name=tag).exists():
+			raise Http404
+		return tag
+
+	def get_posts(self, obj):
+		return BlogContent.published.listing().filter(tags__name=obj)
+
+	def title(self, obj):
+		return obj
+
+	def description(self, obj):
+		return 'Latest posts tagged %s' % obj
+
+	def link(self, obj):
+		return reverse('blogging:tagged-posts', kwargs={'tag': obj})
+
+
+class AtomPostFeed(PostFeed):
+	feed_type = Atom1Feed
+	subtitle = PostFeed.description
+
+
+class AtomSectionFeed(SectionFeed):
+	feed_type = Atom1Feed
+
+	def subtitle(self, obj):
+		return self.description(obj)
+
+
+class AtomTagFeed(TagFeed):
+	feed_type = Atom1Feed
+
+	def subtitle(self, obj):
+		return self.description(obj)
@@ -0,0 +1,203 @@
+"""
+Bulk creation of blog posts.
+
+Posts are described by dictionaries with the following keys:
+	content_type -- name of a leaf BlogContentType.
+	section -- path of the BlogParent the post is filed under.
+	title -- title of the post.
+	fields -- dictionary of the content type fields (as in its form) and their values.
+	tags -- optional list of tag names.
+	author -- username of the author.
+	publication_start -- optional datetime or ISO 8601 string.
+"""
+from itertools import islice
+
+from django.contrib import auth
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from taggit.models import Tag, TaggedItem
+
+from blogging import search
+from blogging.cache import atomic, bump_content_version
+from blogging.models import BlogContent, BlogContentType, BlogParent
+from blogging.tag_counts import add_deltas, apply_tag_count_deltas
+from blogging.archive_counts import add_post, apply_archive_deltas
+from blogging.author_stats import update_author_stats
+from blogging.feeds import bump_scopes
+from blogging.sitemaps import bump_pages
+from blogging.registry import registry
+
+
+def unique(items):
+	seen = set()
+	return [item for item in items if not (item in seen or seen.add(item))]
+
+
+class PostImportError(Exception):
+	pass
+
+
+class PostImporter(object):
+	"""
+	Creates posts with bulk inserts. Content types, sections, authors and tags
+	are looked up once and cached for the whole import.
+	"""
+
+	def __init__(self, chunk_size=500):
+		self.chunk_size = chunk_size
+		self.content_types = {}
+		self.sections = {}
+		self.authors = {}
+		self.tags = {}
+		self.content_type = ContentType.objects.get_for_model(BlogContent)
+
+	def get_content_type(self, name):
+		if name not in self.content_types:
+			try:
+				content_type = BlogContentType.objects.get(content_type=name)
+				entry = registry.get(content_type.id)
+			except (BlogContentType.DoesNotExist, LookupError):
+				raise PostImportError('Unknown content type %s' % name)
+			if not content_type.is_leaf:
+				raise PostImportError('Content type %s can not be used for posts' % name)
+			self.content_types[name] = (content_type, entry.wrapper)
+		return self.content_types[name]
+
+	def get_section(self, path):
+		if path not in self.sections:
+			try:
+				self.sections[path] = BlogParent.objects.get(path=path)
+			except BlogParent.DoesNotExist:
+				raise PostImportError('Unknown section %s' % path)
+		return self.sections[path]
+
+	def get_author(self, username):
+		if username not in self.authors:
+			try:
+				self.authors[username] = auth.models.User.objects.get(username=username)
+			except auth.models.User.DoesNotExist:
+				raise PostImportError('Unknown author %s' % username)
+		return self.authors[username]
+
+	def build_post(self, entry):
+		"""
+		Returns an unsaved BlogContent for entry, with paragraph ids inserted
+		and the listing fields computed.
+		"""
+		content_type, wrapper_class = self.get_content_type(entry['content_type'])
+		wrapper = wrapper_class()
+		for name, value in entry.get('fields', {}).items():
+			setattr(wrapper, name, value)
+		wrapper.title = entry['title']
+		wrapper.pid_count = 0
+		post = BlogContent()
+		wrapper.render_to_db(post)
+		post.section = self.get_section(entry['section'])
+		post.content_type = content_type
+		post.author_id = self.get_author(entry['author'])
+		post.slug = slugify(post.title)
+		publication_start = entry.get('publication_start')
+		if publication_start:
+			if not hasattr(publication_start, 'tzinfo'):
+				publication_start = parse_datetime(publication_start)
+			if timezone.is_naive(publication_start):
+				publication_start = timezone.make_aware(publication_start, timezone.get_default_timezone())
+			post.publication_start = publication_start
+		if not post.field_values:
+			post.update_field_values()
+		post.update_listing_fields()
+		post.update_live_state()
+		return post
+
+	def get_tag_ids(self, names):
+		"""
+		Returns the ids of the named tags, creating the missing ones in bulk.
+		Names are stripped and duplicates dropped. A new tag whose slug is
+		already taken, or shared with another new tag, is created through
+		taggit, which makes its slug unique.
+		"""
+		names = unique(name.strip() for name in names if name.strip())
+		missing = set(name for name in names if name not in self.tags)
+		if missing:
+			for tag in Tag.objects.filter(name__in=missing):
+				self.tags[tag.name] = tag.pk
+			slugs = {}
+			for name in sorted(missing):
+				if name not in self.tags:
+					slugs.setdefault(slugify(name), []).append(name)
+			taken = set(Tag.objects.filter(slug__in=slugs.keys()).values_list('slug', flat=True))
+			new_tags = []
+			other_names = []
+			for slug, slug_names in sorted(slugs.items()):
+				if slug and slug not in taken:
+					new_tags.append(Tag(name=slug_names[0], slug=slug))
+					slug_names = slug_names[1:]
+				other_names.extend(slug_names)
+			# the slugs of the bulk created tags must exist before taggit picks unique ones
+			if new_tags:
+				Tag.objects.bulk_create(new_tags)
+				for tag in Tag.objects.filter(name__in=[tag.name for tag in new_tags]):
+					self.tags[tag.name] = tag.pk
+			for name in other_names:
+				self.tags[name] = Tag.objects.get_or_create(name=name)[0].pk
+		return [self.tags[name] for name in names]
+
+	@atomic
+	def import_chunk(self, entries):
+		# the versions bumped below change once the chunk is committed
+		posts = [self.build_post(entry) for entry in entries]
+
+		# ids are allocated here so that url_path is known before the insert
+		next_id = (BlogContent.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+		for post in posts:
+			post.id = next_id
+			post.url_path = post.find_path(post.section)
+			next_id += 1
+		BlogContent.objects.bulk_create(posts)
+		for sql in connection.ops.sequence_reset_sql(no_style(), [BlogContent]):
+			connection.cursor().execute(sql)
+
+		items = []
+		deltas = {}
+		for post, entry in zip(posts, entries):
+			tag_names = list(entry.get('tags', []))
+			for tag_id in self.get_tag_ids(tag_names):
+				items.append(TaggedItem(content_type=self.content_type, object_id=post.pk, tag_id=tag_id))
+				if post.is_live:
+					add_deltas(deltas, tag_id, post.section_id, 1)
+		TaggedItem.objects.bulk_create(items)
+		bump_pages('posts', [post.pk for post in posts])
+		apply_tag_count_deltas(deltas)
+		archive_deltas = {}
+		for post in posts:
+			add_post(archive_deltas, post)
+		apply_archive_deltas(archive_deltas)
+		update_author_stats(post.author_id_id for post in posts if post.is_live)
+		live = [(post, entry) for post, entry in zip(posts, entries) if post.is_live]
+		if live:
+			bump_scopes(set(post.section_id for post, entry in live),
+						set(name for post, entry in live for name in entry.get('tags', [])))
+		search.index_posts(posts)
+		bump_content_version()
+		return posts
+
+	def run(self, entries):
+		"""
+		Import the iterable of entries chunk by chunk. Returns the number of posts created.
+		"""
+		entries = iter(entries)
+		count = 0
+		while True:
+			chunk = list(islice(entries, self.chunk_size))
+			if not chunk:
+				return count
+			count += len(self.import_chunk(chunk))
+
+
+def import_posts(entries, chunk_size=500):
+	return PostImporter(chunk_size).run(entries)
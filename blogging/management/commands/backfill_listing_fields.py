@@ -0,0 +1,40 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from blogging.cache import bump_content_version
+from blogging.models import BlogContent, BlogParent
+from blogging.utils import get_imageurl_from_data
+
+
+class Command(BaseCommand):
+    help = 'Computes the stored summary, lead image and word count of existing posts and sections.'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of posts loaded per query.'),
+    )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        # update() is used so last_modified and url_path are left untouched
+        for section in BlogParent.objects.only('id', 'data'):
+            BlogParent.objects.filter(pk=section.pk).update(
+                image_url=get_imageurl_from_data(section.data) or '')
+
+        count = 0
+        last_pk = 0
+        while True:
+            posts = list(BlogContent.objects.filter(pk__gt=last_pk)
+                         .order_by('pk').only('id', 'data')[:chunk_size])
+            if not posts:
+                break
+            for post in posts:
+                post.update_listing_fields()
+                BlogContent.objects.filter(pk=post.pk).update(summary=post.summary,
+                                                              image_url=post.image_url,
+                                                              word_count=post.word_count)
+            count += len(posts)
+            last_pk = posts[-1].pk
+            self.stdout.write('Updated %d posts' % count)
+        bump_content_version()
@@ -0,0 +1,59 @@
+import timeit
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.annotator import annotate, Unsupported
+from blogging.tag_lib import insert_tag_id_soup
+
+PARAGRAPH = (u'<p style="text-align:justify"><span style="font-size:14px">A day comes in the life of every '
+             u'programmer when they have to refactor someone else&#39;s code. <strong>Never trust anybody</strong>, '
+             u'not even the future you&nbsp;or the past you. <a href="http://example.com/?a=1&amp;b=2">Source</a>'
+             u'</span></p>\n')
+LIST = (u'<ul>\n<li><span style="font-family:comic sans ms,cursive">Document heavily. No matter if it is absurd, '
+        u'no matter if you&#39;re writing just for yourself.</span><br />\n'
+        u'<img alt="" src="/static/media/images/seuss.jpg" style="height:443px; width:319px" /></li>\n'
+        u'<li>Short item</li>\n</ul>\n')
+
+
+def sample_article(sections):
+    return (PARAGRAPH * 4 + LIST + u'<img alt="" src="/static/media/images/boat.jpg" />\n') * sections
+
+
+class Command(BaseCommand):
+    args = '[<html file> ...]'
+    help = ('Times the streaming paragraph annotator against the BeautifulSoup implementation '
+            'and checks that both write the same bytes. Uses a generated article without files.')
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', type='int', default=10,
+                    help='Number of runs of each implementation per input'),
+        make_option('--sections', type='int', default=50,
+                    help='Size of the generated article'),
+    )
+
+    def handle(self, *args, **options):
+        inputs = []
+        for name in args:
+            try:
+                with open(name) as f:
+                    inputs.append((name, f.read().decode('utf-8')))
+            except (IOError, UnicodeDecodeError) as e:
+                raise CommandError('Can not read %s: %s' % (name, e))
+        if not inputs:
+            inputs.append(('generated article', sample_article(options['sections'])))
+
+        repeat = options['repeat']
+        for name, data in inputs:
+            soup = insert_tag_id_soup(data, 0)
+            try:
+                content, pid_count = annotate(data, 0)
+            except Unsupported as e:
+                self.stdout.write('%s: falls back to BeautifulSoup (%s)' % (name, e))
+                continue
+            if (content, pid_count) != (soup['content'], soup['pid_count']):
+                raise CommandError('%s: the annotator output differs from BeautifulSoup' % name)
+            soup_time = min(timeit.repeat(lambda: insert_tag_id_soup(data, 0), number=1, repeat=repeat))
+            stream_time = min(timeit.repeat(lambda: annotate(data, 0), number=1, repeat=repeat))
+            self.stdout.write('%s: %d bytes, %d ids, soup %.1f ms, streaming %.1f ms (%.1fx)' % (
+                name, len(data.encode('utf-8')), pid_count, soup_time * 1000, stream_time * 1000,
+                soup_time / stream_time))
@@ -0,0 +1,80 @@
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from blogging.benchmark import CorpusSpec, build_corpus, get_scenarios, run_scenario
+
+
+class Command(BaseCommand):
+    help = ('Builds a generated corpus in a test database and times the index, teaser, tagged post '
+            'views and the CMS plugins on it. Prints latency percentiles and query counts, and can save '
+            'them as json to compare runs between commits.')
+    option_list = BaseCommand.option_list + (
+        make_option('--depth', type='int', default=2,
+                    help='Levels of sections below the roots'),
+        make_option('--breadth', type='int', default=3,
+                    help='Number of roots and of children per section'),
+        make_option('--posts', type='int', default=20,
+                    help='Posts per leaf section'),
+        make_option('--paragraphs', type='int', default=12,
+                    help='Paragraphs per post'),
+        make_option('--tags', type='int', default=3,
+                    help='Tags per post'),
+        make_option('--revisions', type='int', default=1,
+                    help='Revisions saved per post, when reversion is installed'),
+        make_option('--samples', type='int', default=10,
+                    help='Distinct urls requested per scenario'),
+        make_option('--repeat', type='int', default=5,
+                    help='Number of times every url is requested'),
+        make_option('--page-cache', action='store_true', dest='page_cache', default=False,
+                    help='Keep the page and plugin caches on'),
+        make_option('--output', help='Write the results as json to this file'),
+        make_option('--compare', help='Print the change against the results saved in this json file'),
+    )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)['scenarios']
+            except (IOError, ValueError, KeyError) as e:
+                raise CommandError('Can not read %s: %s' % (options['compare'], e))
+
+        spec = CorpusSpec(depth=options['depth'], breadth=options['breadth'],
+                          posts_per_section=options['posts'], paragraphs=options['paragraphs'],
+                          tags_per_post=options['tags'], revisions=options['revisions'])
+        verbosity = int(options['verbosity'])
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=max(verbosity - 1, 0), autoclobber=True)
+        try:
+            with override_settings(BLOGGING_PAGE_CACHE=options['page_cache']):
+                results = self.run(spec, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=max(verbosity - 1, 0))
+
+        for name, result in results['scenarios'].items():
+            line = '%-22s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  %3d queries' % (
+                name, result['p50_ms'], result['p90_ms'], result['p99_ms'], result['queries_p50'])
+            if result['errors']:
+                line += '  %d errors' % result['errors']
+            if baseline and name in baseline:
+                line += '  (p50 %.2fx, %+d queries)' % (result['p50_ms'] / max(baseline[name]['p50_ms'], 0.01),
+                                                        result['queries_p50'] - baseline[name]['queries_p50'])
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    def run(self, spec, options):
+        count = build_corpus(spec)
+        if int(options['verbosity']) > 1:
+            self.stdout.write('Created %d posts' % count)
+        results = {'corpus': spec.as_dict(), 'posts': count, 'page_cache': options['page_cache'],
+                   'scenarios': {}}
+        for name, requests in get_scenarios(options['samples'], spec.seed):
+            results['scenarios'][name] = run_scenario(requests, options['repeat'])
+        return results
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Checks that the wrapper and form classes of every content type can be loaded.'
+
+    def handle(self, *args, **options):
+        errors = registry.validate()
+        for content_type, error in errors:
+            self.stderr.write('%s: %s' % (content_type, error))
+        if errors:
+            raise CommandError('%d content types can not be loaded' % len(errors))
+        self.stdout.write('All %d content types can be loaded' % len(registry.get_entries()))
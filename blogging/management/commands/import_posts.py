@@ -0,0 +1,27 @@
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.importer import PostImporter, PostImportError
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    help = 'Creates posts in bulk from a file holding one JSON encoded post per line ' \
+           '(see blogging.importer for the keys of a post).'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of posts inserted per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: manage.py import_posts %s' % self.args)
+        try:
+            with open(args[0]) as fd:
+                entries = (json.loads(line) for line in fd if line.strip())
+                count = PostImporter(options['chunk_size']).run(entries)
+        except (IOError, ValueError, PostImportError) as e:
+            raise CommandError(str(e))
+        self.stdout.write('Imported %d posts' % count)
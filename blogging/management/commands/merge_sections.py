@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.models import BlogParent
+
+
+class Command(BaseCommand):
+    args = '<source section path> <target section path>'
+    help = 'Moves the subsections and posts of the source section into the target and deletes the source.'
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: manage.py merge_sections %s' % self.args)
+        try:
+            source = BlogParent.objects.get(path=args[0])
+            target = BlogParent.objects.get(path=args[1])
+        except BlogParent.DoesNotExist:
+            raise CommandError('No section with the given path')
+        try:
+            source.merge_into(target)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Merged %s into %s' % (args[0], target.path))
@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogging.models import BlogContent
+
+
+class Command(BaseCommand):
+    help = ('Stores the fields of posts saved before structured field values, parsed from their '
+            'tagged text. Posts already migrated are skipped, so the command can be interrupted and rerun.')
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of posts converted per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        count = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                posts = list(BlogContent.objects.filter(pk__gt=last_pk, field_values='')
+                             .order_by('pk').only('id', 'data')[:chunk_size])
+                if not posts:
+                    break
+                # update() is used so last_modified and the other derived columns are left untouched
+                for post in posts:
+                    post.update_field_values()
+                    BlogContent.objects.filter(pk=post.pk).update(field_values=post.field_values,
+                                                                  pid_count=post.pid_count)
+            count += len(posts)
+            last_pk = posts[-1].pk
+            self.stdout.write('Migrated %d posts' % count)
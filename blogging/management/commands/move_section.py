@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.models import BlogParent
+
+
+class Command(BaseCommand):
+    args = '<section path> [<new parent path>]'
+    help = 'Moves a section with all its subsections and posts under a new parent, or to the root.'
+
+    def handle(self, *args, **options):
+        if len(args) not in (1, 2):
+            raise CommandError('Usage: manage.py move_section %s' % self.args)
+        try:
+            section = BlogParent.objects.get(path=args[0])
+            parent = BlogParent.objects.get(path=args[1]) if len(args) == 2 else None
+        except BlogParent.DoesNotExist:
+            raise CommandError('No section with the given path')
+        try:
+            section.move_section(parent)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Moved section to %s' % section.path)
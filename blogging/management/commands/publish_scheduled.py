@@ -0,0 +1,22 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from blogging import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Makes the posts whose publication time has come live. Run it from cron, or with --loop as a service.'
+    option_list = BaseCommand.option_list + (
+        make_option('--loop', action='store_true', dest='loop', default=False,
+                    help='Keep running and publish every post at its publication time.'),
+        make_option('--max-sleep', dest='max_sleep', type='int', default=60,
+                    help='Longest wait, in seconds, between two checks when looping.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            scheduler.run(options['max_sleep'], self.stdout)
+        else:
+            posts = scheduler.publish_due()
+            self.stdout.write('Published %d posts' % len(posts))
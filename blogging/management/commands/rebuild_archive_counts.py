@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blogging.archive_counts import rebuild_archive_counts
+from blogging.models import ArchiveCount
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the number of live posts per month shown by the archive pages.'
+
+    def handle(self, *args, **options):
+        rebuild_archive_counts()
+        self.stdout.write('Stored %d archive months' % ArchiveCount.objects.count())
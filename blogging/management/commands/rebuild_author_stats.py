@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blogging.author_stats import rebuild_author_stats
+from blogging.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the number of live posts and the latest publication of every author.'
+
+    def handle(self, *args, **options):
+        rebuild_author_stats()
+        self.stdout.write('Stored the stats of %d authors' % AuthorStats.objects.count())
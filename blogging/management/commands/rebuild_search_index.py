@@ -0,0 +1,19 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging import search
+
+
+class Command(BaseCommand):
+    help = 'Fills the full text search table with the text of every post.'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of posts loaded per query.'),
+    )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Full text search needs an SQLite database with FTS5 support')
+        count = search.rebuild_index(options['chunk_size'])
+        self.stdout.write('Indexed %d posts' % count)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blogging.cache import bump_content_version
+from blogging.models import BlogParent
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored slug path and ancestor ids of every section.'
+
+    def handle(self, *args, **options):
+        paths = {}
+        nodes = BlogParent.objects.order_by('tree_id', 'lft').values_list('pk', 'parent', 'slug')
+        for pk, parent_id, slug in nodes:
+            if parent_id is None:
+                paths[pk] = (slug, [])
+            else:
+                parent_path, parent_ids = paths[parent_id]
+                paths[pk] = (parent_path + '/' + slug, parent_ids + [parent_id])
+            BlogParent.objects.filter(pk=pk).update(path=paths[pk][0],
+                                                    ancestor_ids=','.join(str(i) for i in paths[pk][1]))
+        bump_content_version()
+        self.stdout.write('Updated %d sections' % len(paths))
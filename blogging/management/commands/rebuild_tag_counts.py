@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blogging.models import TagCount
+from blogging.tag_counts import rebuild_tag_counts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the number of live posts per tag, for the site and for every section.'
+
+    def handle(self, *args, **options):
+        rebuild_tag_counts()
+        self.stdout.write('Stored %d tag counts' % TagCount.objects.count())
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.models import BlogParent
+
+
+class Command(BaseCommand):
+    args = '<section path> <new title>'
+    help = 'Renames a section and rewrites the urls of all its subsections and posts.'
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: manage.py rename_section %s' % self.args)
+        try:
+            section = BlogParent.objects.get(path=args[0])
+        except BlogParent.DoesNotExist:
+            raise CommandError('No section with path %s' % args[0])
+        section.rename_section(args[1])
+        self.stdout.write('Renamed section to %s' % section.path)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blogging.models import BlogContentType, BlogContentTypeField
+from blogging.registry import content_types_changed, get_module_name
+from blogging.utils import create_content_type
+from blogging.wrapper import find_class
+
+
+class Command(BaseCommand):
+    args = '<content type> [<content type> ...]'
+    help = ('Stores the fields of content types generated into blogging/custom/ in the database. '
+            'Only modules written by CreateClass keep their data layout; DefaultBlog and '
+            'DefaultSection store raw html and must not be converted.')
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Usage: manage.py store_content_type_fields %s' % self.args)
+        for name in args:
+            try:
+                content_type = BlogContentType.objects.get(content_type=name)
+            except BlogContentType.DoesNotExist:
+                raise CommandError('No content type named %s' % name)
+            if content_type.fields.exists():
+                self.stdout.write('%s already has stored fields' % name)
+                continue
+            try:
+                wrapper = find_class(get_module_name(content_type), str(content_type))
+            except (ImportError, AttributeError) as e:
+                raise CommandError('Can not load the module of %s: %s' % (name, e))
+            fields = [(tag['name'][:-len('_tag')], tag['type']) for tag in wrapper.tag_list
+                      if tag['name'] not in ('title_tag', 'pid_count_tag')]
+            try:
+                with transaction.atomic():
+                    create_content_type(content_type, fields)
+            except ValueError as e:
+                raise CommandError('%s: %s' % (name, e))
+            content_types_changed(BlogContentTypeField)
+            self.stdout.write('Stored %d fields of %s' % (len(fields), name))
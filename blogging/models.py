@@ -1,6 +1,8 @@
 from django.utils import timezone
 import sys
-from django.db import models
+import json
+import datetime
+from django.db import models, connection
 from django.db.models import Q
 
 from django.contrib import auth
@@ -18,8 +20,9 @@ if 'cms' in settings.INSTALLED_APPS:
     except ImportError:
         print 'CMS not installed'
     
-from blogging.utils import get_imageurl_from_data, strip_image_from_data, truncatewords
-from blogging.tag_lib import strip_tag_from_data
+from blogging.utils import get_imageurl_from_data, get_text_from_data, truncatewords
+from blogging.cache import cached_plugin_value, atomic
+from blogging.tag_lib import scan_fields
 from django.utils.html import strip_tags
 from django.core.urlresolvers import reverse
 import traceback
@@ -38,40 +41,118 @@ LATEST_PLUGIN_TEMPLATES = (
 )
  
 
+def prefetch_tags(posts):
+    """
+    Fetch the tags of all posts with a single query and attach them to every
+    post as the list of {name, url} dictionaries returned by get_tags().
+    """
+    posts = [post for post in posts if post.pk is not None]
+    if not posts:
+        return
+    tag_lists = dict((post.pk, []) for post in posts)
+    urls = {}
+    items = (TaggedItem.objects
+                       .filter(**TaggedItem.bulk_lookup_kwargs(posts))
+                       .select_related('tag')
+                       .order_by('pk'))
+    for item in items:
+        name = item.tag.name
+        if name not in urls:
+            urls[name] = reverse('blogging:tagged-posts', kwargs={'tag': name})
+        tag_lists[item.object_id].append({'name': name, 'url': urls[name]})
+    for post in posts:
+        post._tag_list = tag_lists[post.pk]
+
+
+class PostQuerySet(models.query.QuerySet):
+    """
+    QuerySet which, when asked with with_tags(), attaches the tags of all the
+    fetched posts using one query instead of one query per post.
+    """
+    _with_tags = False
+
+    def with_tags(self):
+        return self._clone(_with_tags=True)
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_with_tags', self._with_tags)
+        return super(PostQuerySet, self)._clone(klass, setup, **kwargs)
+
+    def _fetch_all(self):
+        fetch_tags = self._with_tags and self._result_cache is None
+        super(PostQuerySet, self)._fetch_all()
+        if fetch_tags:
+            prefetch_tags(self._result_cache)
+
+
+def _concat(*parts):
+    """
+    Returns the sql expression concatenating the given sql expressions.
+    """
+    if connection.vendor == 'mysql':
+        return 'CONCAT(%s)' % ', '.join(parts)
+    return ' || '.join(parts)
+
+
+def _column(model, name):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
 class RelatedManager(models.Manager):
 
     def get_query_set(self):
-        qs = super(RelatedManager, self).get_query_set()
+        qs = PostQuerySet(self.model, using=self._db)
         return qs
 
-    def get_tags(self, language):
-        """Returns tags used to tag post and its count. Results are ordered by count."""
+    def with_tags(self):
+        return self.get_query_set().with_tags()
 
-        # get tagged post
-        entries = self.get_query_set().distinct()
-        if not entries:
-            return []
-        kwargs = TaggedItem.bulk_lookup_kwargs(entries)
+    def get_tags(self, language=None, section=None, limit=None):
+        """
+        Returns tags used to tag live posts with their count. Results are ordered by count.
+        Counts are read from TagCount, for the whole site or for the subtree of section.
+        """
+        counts = TagCount.objects.filter(count__gt=0)
+        if section is not None and not section.is_leaf_node():
+            subtree = section.get_descendants(include_self=True).values('pk')
+            counted_tags = (counts.filter(section__in=subtree)
+                                  .values('tag')
+                                  .annotate(total=models.Sum('count'))
+                                  .order_by('-total')
+                                  .values_list('tag', 'total'))
+            counted_tags = list(counted_tags[:limit] if limit else counted_tags)
+            tags = Tag.objects.in_bulk([tag_id for tag_id, total in counted_tags])
+            for tag_id, total in counted_tags:
+                tags[tag_id].count = total
+            return [tags[tag_id] for tag_id, total in counted_tags]
 
-        # aggregate and sort
-        counted_tags = dict(TaggedItem.objects
-                                      .filter(**kwargs)
-                                      .values('tag')
-                                      .annotate(count=models.Count('tag'))
-                                      .values_list('tag', 'count'))
+        counts = counts.filter(section=section).select_related('tag').order_by('-count')
+        if limit:
+            counts = counts[:limit]
+        tags = []
+        for tag_count in counts:
+            tag_count.tag.count = tag_count.count
+            tags.append(tag_count.tag)
+        return tags
 
-        # and finally get the results
-        tags = Tag.objects.filter(pk__in=counted_tags.keys())
-        for tag in tags:
-            tag.count = counted_tags[tag.pk]
-        return sorted(tags, key=lambda x: -x.count)
+    def listing(self):
+        """
+        Returns entries for teaser/list views. Cards are rendered from the stored
+        summary and image columns, so the body is deferred, the section and the
+        author joined and the tags of the whole page fetched at once.
+        """
+        return (self.get_query_set().select_related('section', 'author_id')
+                    .defer('data', 'revision_diff', 'field_values').with_tags())
 
 class PublishedManager(RelatedManager):
+    """
+    Returns the live posts. is_live is set on save for posts already due and by
+    the publish_scheduled command for the later ones, so that the query does
+    not depend on the current time and its results can be cached.
+    """
     def get_query_set(self):
         qs = super(PublishedManager, self).get_query_set()
-        now = timezone.now()
-        qs = qs.filter(publication_start__lte=now)
-        qs = qs.filter(Q(published_flag=True))
+        qs = qs.filter(is_live=True)
         return qs
 
 
@@ -82,37 +163,175 @@ class BlogContentType(models.Model):
     def __unicode__(self):
         return self.content_type
 
+class BlogContentTypeField(models.Model):
+    """
+    One field of a content type. The wrapper and form classes of the content
+    type are built from these rows by blogging.schema.
+    """
+    FIELD_TYPES = (
+        ('CharField', 'TextField'),
+        ('TextField', 'TextArea'),
+    )
+    content_type = models.ForeignKey(BlogContentType, related_name='fields')
+    name = models.CharField(max_length = 100)
+    field_type = models.CharField(max_length = 20, choices = FIELD_TYPES)
+    position = models.PositiveIntegerField(default = 0)
+
+    class Meta:
+        ordering = ['position', 'id']
+        unique_together = (('content_type', 'name'),)
+
+    def __unicode__(self):
+        return self.name
+
 class BlogParent(MPTTModel):
     title = models.CharField(max_length = 50, unique=True)
     parent = TreeForeignKey('self', null=True, blank=True, related_name='children', db_index=True)
     data = models.TextField(null= False)
     content_type = models.ForeignKey(BlogContentType,null=True,default=None)
     slug = models.SlugField()
+    image_url = models.CharField(max_length = 255, blank=True, default='')
+    # slug path from the root and comma separated ids of the ancestors, maintained in save()
+    path = models.CharField(max_length = 255, blank=True, default='', db_index=True)
+    ancestor_ids = models.CharField(max_length = 255, blank=True, default='')
     def __unicode__(self):
         return self.title
+    @atomic
     def save(self, *args, **kwargs):
         self.slug = slugify(self.title)
-        blogs = BlogContent.objects.filter(section=self.parent)
-        if blogs:
+        self.image_url = get_imageurl_from_data(self.data) or ''
+        old_path = self.path
+        old_ids = self.ancestor_ids
+        self.update_path()
+        if self.parent_id and BlogContent.objects.filter(section=self.parent_id).exists():
             try:
                 orphan_parent = BlogParent.objects.get(title='Orphan')
-                for blog in blogs:
-                    blog.section = orphan_parent
-                    blog.save()
-            except:
+                orphan_parent.take_posts(self.parent)
+            except BlogParent.DoesNotExist:
                 print 'FATAL ERROR CAN DO NOTHING'            
         super(BlogParent, self).save(*args, **kwargs)
+        if old_path and old_path != self.path:
+            old_ids = ','.join(filter(None, [old_ids, str(self.pk)]))
+            self.rewrite_subtree_paths(old_path, old_ids)
+
+    def update_path(self):
+        """
+        Set path and ancestor_ids from the parent, which must be up to date.
+        """
+        if self.parent_id:
+            parent = self.parent
+            self.path = parent.form_url() + '/' + self.slug
+            self.ancestor_ids = ','.join(str(pk) for pk in parent.get_ancestor_ids() + [parent.pk])
+        else:
+            self.path = self.slug
+            self.ancestor_ids = ''
+
+    def rewrite_subtree_paths(self, old_path, old_ids):
+        """
+        Rewrite the stored paths below this node after its own path changed.
+        old_path is the previous path of the node and old_ids the previous ids of
+        its ancestors with the node itself. Descendant sections and the url_path
+        of every post in the subtree are each updated with a single statement.
+        """
+        new_ids = ','.join(str(pk) for pk in self.get_ancestor_ids() + [self.pk])
+        opts = self._mptt_meta
+        tree_id = getattr(self, opts.tree_id_attr)
+        left = getattr(self, opts.left_attr)
+        right = getattr(self, opts.right_attr)
+        path = _column(BlogParent, 'path')
+        ancestor_ids = _column(BlogParent, 'ancestor_ids')
+        tree_where = '%s = %%s AND %s > %%s AND %s < %%s' % (_column(BlogParent, opts.tree_id_attr),
+                                                            _column(BlogParent, opts.left_attr),
+                                                            _column(BlogParent, opts.right_attr))
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE %s SET %s = %s, %s = %s WHERE %s' % (
+                connection.ops.quote_name(BlogParent._meta.db_table),
+                path, _concat('%s', 'SUBSTR(%s, %%s)' % path),
+                ancestor_ids, _concat('%s', 'SUBSTR(%s, %%s)' % ancestor_ids),
+                tree_where),
+            [self.path, len(old_path) + 1, new_ids, len(old_ids) + 1, tree_id, left, right])
+
+        url_path = _column(BlogContent, 'url_path')
+        cursor.execute(
+            'UPDATE %s SET %s = %s WHERE %s LIKE %%s AND %s IN (SELECT %s FROM %s WHERE %s)' % (
+                connection.ops.quote_name(BlogContent._meta.db_table),
+                url_path, _concat('%s', 'SUBSTR(%s, %%s)' % url_path),
+                url_path, _column(BlogContent, 'section'),
+                _column(BlogParent, 'id'), connection.ops.quote_name(BlogParent._meta.db_table),
+                tree_where.replace('>', '>=').replace('<', '<=')),
+            [self.path + '/', len(old_path) + 2, old_path + '/%', tree_id, left, right])
+
+    def take_posts(self, source):
+        """
+        Move every post of the source section into this section.
+        """
+        old_path = source.form_url()
+        url_path = _column(BlogContent, 'url_path')
+        BlogContent.objects.filter(section=source).update(section=self)
+        tag_counts.rebuild_tag_counts([source.pk, self.pk])
+        connection.cursor().execute(
+            'UPDATE %s SET %s = %s WHERE %s = %%s AND %s LIKE %%s' % (
+                connection.ops.quote_name(BlogContent._meta.db_table),
+                url_path, _concat('%s', 'SUBSTR(%s, %%s)' % url_path),
+                _column(BlogContent, 'section'), url_path),
+            [self.form_url() + '/', len(old_path) + 2, self.pk, old_path + '/%'])
+
+    @atomic
+    def move_section(self, parent):
+        """
+        Move the node with its subtree under parent, or to the root if parent is None.
+        """
+        if parent is not None and parent.is_descendant_of(self, include_self=True):
+            raise ValueError('Cannot move %s below itself' % self.title)
+        self.parent = parent
+        self.save()
+
+    @atomic
+    def rename_section(self, title):
+        """
+        Change the title, and so the slug, of the node and rewrite the paths below it.
+        """
+        self.title = title
+        self.save()
+
+    @atomic
+    def merge_into(self, target):
+        """
+        Move the children and posts of this node into target and delete the node.
+        """
+        if target.is_descendant_of(self, include_self=True):
+            raise ValueError('Cannot merge %s into its own subtree' % self.title)
+        # every move shifts lft/rght values, so both sides are reloaded before each one
+        for pk in list(self.get_children().values_list('pk', flat=True)):
+            BlogParent.objects.get(pk=pk).move_section(BlogParent.objects.get(pk=target.pk))
+        BlogParent.objects.get(pk=target.pk).take_posts(BlogParent.objects.get(pk=self.pk))
+        BlogParent.objects.get(pk=self.pk).delete()
+
+    def get_ancestor_ids(self):
+        if self.ancestor_ids:
+            return [int(pk) for pk in self.ancestor_ids.split(',')]
+        if self.path or not self.pk:
+            return []
+        return list(self.get_ancestors().values_list('pk', flat=True))
+
+    def get_breadcrumb(self):
+        """
+        Returns the ancestors of the node, itself included, ordered from the root,
+        as nodes of the tree snapshot.
+        """
+        return get_tree().get_ancestors(self.pk, include_self=True)
     
     def form_url(self):
+        if self.path:
+            return self.path
+        # rows saved before path was stored
         parent_list = self.get_ancestors(include_self=True)
         return_path = '/'.join(word.slug for word in parent_list)
-        #print "inside absolute URL ", return_path
         return return_path
     
     def get_image_url(self):
-        image = get_imageurl_from_data(self.data)
-        print image 
-        return image
+        return self.image_url or None
     
     def get_absolute_url(self):
         kwargs = {'slug': str(self.form_url())}
@@ -137,6 +356,18 @@ class BlogContent(models.Model):
     slug = models.SlugField(max_length= 100)
     tags = TaggableManager(blank=True)
     publication_start = models.DateTimeField(('Published Since'), default=timezone.now, help_text=('Used for automatic delayed publication. For this feature to work published_flag must be on.'))
+    # published_flag is on and publication_start has passed, see PublishedManager
+    is_live = models.BooleanField(default=False, db_index=True, editable=False)
+    # listing card values derived from data in save()
+    summary = models.TextField(blank=True, default='')
+    image_url = models.CharField(max_length= 255, blank=True, default='')
+    word_count = models.PositiveIntegerField(default=0)
+    # html diff of the two latest revisions, computed when a revision is saved
+    revision_diff = models.TextField(blank=True, default='')
+    # json of the content type fields keyed by field name and the paragraph id
+    # counter, see set_field_values(); empty for rows not yet migrated
+    field_values = models.TextField(blank=True, default='', editable=False)
+    pid_count = models.PositiveIntegerField(default=0, editable=False)
     objects = RelatedManager()    
     published = PublishedManager()
     
@@ -148,32 +379,58 @@ class BlogContent(models.Model):
         return reverse('blogging:teaser-view', kwargs=kwargs)
     
     def get_image_url(self):
-        image =  get_imageurl_from_data(self.data)
-        print "LOGS:: Fetching Image for node"
-        if image:
-            print image
-            return image
+        if self.image_url:
+            return self.image_url
         else:
             return self.section.get_image_url()
 
     def get_summary(self):
-        summary = self.data
-        print "LOGS:: Fetching Node summary"
-        summary = strip_tag_from_data(summary)
-        summary = strip_image_from_data(summary)
-        summary = strip_tags(summary)
-        summary = truncatewords(summary, 150)
-        return summary
+        return self.summary
+
+    def update_live_state(self):
+        self.is_live = bool(self.published_flag) and self.publication_start <= timezone.now()
+
+    def update_listing_fields(self):
+        """
+        Compute the summary, lead image and word count stored for listing cards.
+        """
+        text = get_text_from_data(self.data)
+        self.summary = truncatewords(text, 150)
+        self.image_url = get_imageurl_from_data(self.data) or ''
+        self.word_count = len(text.split())
     
+    def set_field_values(self, values, pid_count):
+        """
+        Store the field values written by a content type wrapper, keyed by
+        field name, together with its paragraph id counter.
+        """
+        self.field_values = json.dumps(values)
+        self.pid_count = pid_count
+        self._field_values_set = True
+
+    def update_field_values(self):
+        """
+        Derive field_values and pid_count from the tagged text in data, for
+        content written without set_field_values (the admin, generated modules).
+        """
+        values = scan_fields(self.data)
+        pid_count = values.pop('pid_count', '').strip()
+        self.field_values = json.dumps(values)
+        self.pid_count = int(pid_count) if pid_count.isdigit() else 0
+
+    def get_pid_count(self):
+        if self.field_values:
+            return self.pid_count
+        pid_count = scan_fields(self.data).get('pid_count', '').strip()
+        return int(pid_count) if pid_count.isdigit() else 0
+
     def get_title(self):
         return self.title
     
     
     def find_path(self,section): 
-        parent_list = section.get_ancestors(include_self=True)
-        return_path = '/'.join(word.slug for word in parent_list)
+        return_path = section.form_url()
         return_path = return_path + str("/") + self.slug + str("/") + str(self.id)
-        print return_path
         return return_path
 
     def get_menu_title(self):
@@ -183,35 +440,24 @@ class BlogContent(models.Model):
         return self.section
 
     def get_tags(self):
-        tags = self.tags.all()
-        tag_list = []
-        print "LOGS:Get Tags Called for ", self.title
-        print "LOGS: tags are ", tags
-        for tag in tags:
-            print "LOGS: hey there!!!"
-            try:
-                tmp = {}
-                tmp['name'] = tag.name
-                kwargs = {'tag': tag.name,}
-                tmp['url'] = reverse('blogging:tagged-posts',kwargs=kwargs)
-                print "LOGS: TAG NAME ", tmp['name'],"URL ", tmp['url']
-                tag_list.append(tmp)
-                print "LOGS: Printing tags ", tmp
-            except:
-                print "Unexpected error:", sys.exc_info()[0]
-                for frame in traceback.extract_tb(sys.exc_info()[2]):
-                    fname,lineno,fn,text = frame
-                    print "Error in %s on line %d" % (fname, lineno)
-        return tag_list
+        if not hasattr(self, '_tag_list'):
+            prefetch_tags([self])
+        return self._tag_list
     
     def get_author(self):
-        print self.author_id
         return self.author_id
-        #return self.author_id.first_name or self.author_id.username  
+
+    def get_author_url(self):
+        return reverse('blogging:author-posts', kwargs={'slug': self.author_id.username})
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if not getattr(self, '_field_values_set', False):
+            self.update_field_values()
+        self._field_values_set = False
+        self.update_listing_fields()
+        self.update_live_state()
         super(BlogContent, self).save(*args, **kwargs)
         self.url_path = self.find_path(self.section)
         super(BlogContent, self).save(*args, **kwargs)
@@ -221,7 +467,60 @@ class BlogContent(models.Model):
         return self.title
 
     class Meta:
-        ordering = ['-publication_start']
+        ordering = ['-publication_start', '-id']
+        index_together = [['publication_start', 'id'], ['section', 'publication_start'],
+                          ['author_id', 'publication_start']]
+
+
+class TagCount(models.Model):
+    """
+    Number of live posts using a tag, for the whole site (section is null) or
+    for the posts filed directly under section. Maintained by blogging.tag_counts.
+    """
+    tag = models.ForeignKey(Tag, related_name='blogging_counts')
+    section = models.ForeignKey(BlogParent, null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['tag', 'section']]
+        index_together = [['section', 'count']]
+
+
+class ArchiveCount(models.Model):
+    """
+    Number of live posts published in a month, in the current time zone.
+    Maintained by blogging.archive_counts.
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['year', 'month']]
+        ordering = ['-year', '-month']
+
+    def get_date(self):
+        return datetime.date(self.year, self.month, 1)
+
+    def get_absolute_url(self):
+        return reverse('blogging:archive-month', kwargs={'year': '%04d' % self.year, 'month': '%02d' % self.month})
+
+
+class AuthorStats(models.Model):
+    """
+    Number of live posts of an author and publication time of the latest one.
+    Maintained by blogging.author_stats.
+    """
+    author = models.OneToOneField(auth.models.User, related_name='blogging_stats')
+    post_count = models.PositiveIntegerField(default=0)
+    last_published = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-last_published']
+        index_together = [['post_count', 'last_published']]
+
+    def get_absolute_url(self):
+        return reverse('blogging:author-posts', kwargs={'slug': self.author.username})
 
 
 if 'cms' in settings.INSTALLED_APPS:
@@ -238,23 +537,21 @@ if 'cms' in settings.INSTALLED_APPS:
         def copy_relations(self, oldinstance):
             self.tags = oldinstance.tags.all()
     
-        def get_posts(self):
-            if self.parent_section:
-                if self.parent_section.is_leaf_node():
-                    posts = BlogContent.published.filter(section=self.parent_section)
-                    print 'parent is leaf node'
-                else:
-                    print 'parent is non leaf node'
-                    parent_list = self.parent_section.get_descendants()
-                    print 'parent list is ', parent_list
-                    posts = BlogContent.published.filter(section__in=parent_list)
+        def get_post_queryset(self):
+            if self.parent_section_id:
+                section_ids = get_tree().get_descendant_ids(self.parent_section_id, include_self=True)
+                posts = BlogContent.published.listing().filter(section__in=section_ids)
             else:
-                posts = BlogContent.published.all()
+                posts = BlogContent.published.listing()
             
             tags = list(self.tags.all())
             if tags:
                 posts = posts.filter(tags__in=tags)
-            return posts[:self.latest_entries]
+            return posts
+
+        def get_posts(self):
+            return cached_plugin_value(self, 'posts',
+                                       lambda: list(self.get_post_queryset()[:self.latest_entries]))
         
         def get_section(self):
             return self.parent_section
@@ -270,10 +567,11 @@ if 'cms' in settings.INSTALLED_APPS:
             return str(self.section_count)
     
         def get_sections(self):
-            if self.parent_section:
-                sections = self.parent_section.get_children()
+            tree = get_tree()
+            if self.parent_section_id:
+                sections = tree.get_children(self.parent_section_id)
             else:
-                sections = BlogParent.objects.all(~Q(title='Orphan'),level=0)
+                sections = tree.get_roots()
             if self.section_count:
                 return sections[:self.section_count]
             return sections
@@ -285,6 +583,91 @@ if 'cms' in settings.INSTALLED_APPS:
             return 'ContactPlugin'
         def thanks(self):
             return self.thanks_text
+
+from django.db.models.signals import post_save, post_delete
+from blogging.cache import content_changed
+
+for sender in (BlogContent, BlogParent, TaggedItem):
+    post_save.connect(content_changed, sender=sender, dispatch_uid='blogging-page-cache')
+    post_delete.connect(content_changed, sender=sender, dispatch_uid='blogging-page-cache')
+
+from django.db.models.signals import post_init
+from blogging import tag_counts
+
+post_init.connect(tag_counts.remember_post_state, sender=BlogContent, dispatch_uid='blogging-tag-counts')
+post_save.connect(tag_counts.post_saved, sender=BlogContent, dispatch_uid='blogging-tag-counts')
+post_save.connect(tag_counts.tagged_item_saved, sender=TaggedItem, dispatch_uid='blogging-tag-counts')
+post_delete.connect(tag_counts.tagged_item_deleted, sender=TaggedItem, dispatch_uid='blogging-tag-counts')
+
+from blogging import archive_counts
+
+post_init.connect(archive_counts.remember_post_state, sender=BlogContent, dispatch_uid='blogging-archive-counts')
+post_save.connect(archive_counts.post_saved, sender=BlogContent, dispatch_uid='blogging-archive-counts')
+post_delete.connect(archive_counts.post_deleted, sender=BlogContent, dispatch_uid='blogging-archive-counts')
+
+from blogging import author_stats
+
+post_init.connect(author_stats.remember_post_state, sender=BlogContent, dispatch_uid='blogging-author-stats')
+post_save.connect(author_stats.post_saved, sender=BlogContent, dispatch_uid='blogging-author-stats')
+post_delete.connect(author_stats.post_deleted, sender=BlogContent, dispatch_uid='blogging-author-stats')
+
+from blogging import feeds
+
+post_init.connect(feeds.remember_post_state, sender=BlogContent, dispatch_uid='blogging-feeds')
+post_save.connect(feeds.post_changed, sender=BlogContent, dispatch_uid='blogging-feeds')
+post_delete.connect(feeds.post_changed, sender=BlogContent, dispatch_uid='blogging-feeds')
+post_save.connect(feeds.tagged_item_changed, sender=TaggedItem, dispatch_uid='blogging-feeds')
+post_delete.connect(feeds.tagged_item_changed, sender=TaggedItem, dispatch_uid='blogging-feeds')
+
+from blogging import sitemaps
+
+post_save.connect(sitemaps.post_changed, sender=BlogContent, dispatch_uid='blogging-sitemaps')
+post_delete.connect(sitemaps.post_changed, sender=BlogContent, dispatch_uid='blogging-sitemaps')
+
+from blogging import search
+from blogging.tree import get_tree, tree_changed
+from blogging.registry import content_types_changed
+
+post_save.connect(tree_changed, sender=BlogParent, dispatch_uid='blogging-tree')
+post_delete.connect(tree_changed, sender=BlogParent, dispatch_uid='blogging-tree')
+post_save.connect(content_types_changed, sender=BlogContentType, dispatch_uid='blogging-registry')
+post_delete.connect(content_types_changed, sender=BlogContentType, dispatch_uid='blogging-registry')
+post_save.connect(content_types_changed, sender=BlogContentTypeField, dispatch_uid='blogging-registry')
+post_delete.connect(content_types_changed, sender=BlogContentTypeField, dispatch_uid='blogging-registry')
+
+post_save.connect(search.post_saved, sender=BlogContent, dispatch_uid='blogging-search')
+post_delete.connect(search.post_deleted, sender=BlogContent, dispatch_uid='blogging-search')
+
+if 'reversion' in settings.INSTALLED_APPS:
+    import reversion
+    try:
+        # reversion only defines generate_diffs when diff_match_patch is installed
+        from reversion.helpers import generate_diffs
+    except ImportError:
+        generate_diffs = None
+    from reversion.models import post_revision_commit
+    from django.contrib.contenttypes.models import ContentType
+
+    def update_revision_diff(sender, revision, versions, **kwargs):
+        """
+        Store the diff between the two latest revisions of every post in the new
+        revision. Nothing is stored when diff_match_patch is not installed.
+        """
+        if generate_diffs is None:
+            return
+        content_type = ContentType.objects.get_for_model(BlogContent)
+        for version in versions:
+            if version.content_type_id != content_type.id:
+                continue
+            available_versions = list(reversion.get_for_object_reference(BlogContent, version.object_id)[:2])
+            patch_html = ""
+            if len(available_versions) > 1:
+                old_version = available_versions[0]
+                new_version = available_versions[1]
+                patch_html = generate_diffs(old_version, new_version, "data", cleanup="semantic")
+            BlogContent.objects.filter(pk=version.object_id).update(revision_diff=patch_html)
+
+    post_revision_commit.connect(update_revision_diff, dispatch_uid='blogging-revision-diff')
             
 """
 class Migration(DataMigration):
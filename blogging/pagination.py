@@ -0,0 +1,101 @@
+"""
+Keyset pagination of posts.
+
+Posts are ordered from the newest to the oldest on (publication_start, id) and a
+page is selected with the position of its boundary post instead of an offset,
+so fetching any page costs the same whatever its depth.
+The position is passed in the `after` (next page) or `before` (previous page)
+query parameter, optionally prefixed to allow several lists on one page.
+"""
+import calendar
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+PAGE_SIZE = getattr(settings, 'BLOGGING_PAGE_SIZE', 20)
+
+
+def encode_cursor(post):
+	"""
+	Returns the url safe position of post: epoch microseconds and id.
+	"""
+	start = post.publication_start
+	if timezone.is_aware(start):
+		start = timezone.make_naive(start, timezone.utc)
+	micro = calendar.timegm(start.timetuple()) * 1000000 + start.microsecond
+	return '%d.%d' % (micro, post.pk)
+
+
+def decode_cursor(cursor):
+	"""
+	Returns the (publication_start, id) tuple of the cursor or None if it is invalid.
+	"""
+	try:
+		micro, pk = [int(value) for value in cursor.split('.')]
+		start = datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=micro)
+	except (AttributeError, ValueError, OverflowError):
+		return None
+	if settings.USE_TZ:
+		start = timezone.make_aware(start, timezone.utc)
+	return start, pk
+
+
+class KeysetPage(object):
+
+	def __init__(self, object_list, request, prefix, has_next, has_previous):
+		self.object_list = object_list
+		self.request = request
+		self.prefix = prefix
+		self.has_next = has_next
+		self.has_previous = has_previous
+
+	def __iter__(self):
+		return iter(self.object_list)
+
+	def __len__(self):
+		return len(self.object_list)
+
+	def _query(self, param, post):
+		query = self.request.GET.copy()
+		for name in ('after', 'before', 'fragment'):
+			query.pop(self.prefix + name, None)
+		query[self.prefix + param] = encode_cursor(post)
+		return '?' + query.urlencode()
+
+	def next_query(self):
+		if self.has_next and self.object_list:
+			return self._query('after', self.object_list[-1])
+		return None
+
+	def previous_query(self):
+		if self.has_previous and self.object_list:
+			return self._query('before', self.object_list[0])
+		return None
+
+
+def paginate(queryset, request, per_page=None, prefix=''):
+	"""
+	Returns the KeysetPage of queryset selected by the request parameters.
+	"""
+	per_page = per_page or PAGE_SIZE
+	after = decode_cursor(request.GET.get(prefix + 'after'))
+	before = decode_cursor(request.GET.get(prefix + 'before'))
+
+	if before and not after:
+		start, pk = before
+		queryset = queryset.filter(Q(publication_start__gt=start) |
+								   Q(publication_start=start, pk__gt=pk))
+		posts = list(queryset.order_by('publication_start', 'id')[:per_page + 1])
+		has_previous = len(posts) > per_page
+		posts = posts[:per_page]
+		posts.reverse()
+		return KeysetPage(posts, request, prefix, True, has_previous)
+
+	if after:
+		start, pk = after
+		queryset = queryset.filter(Q(publication_start__lt=start) |
+								   Q(publication_start=start, pk__lt=pk))
+	posts = list(queryset.order_by('-publication_start', '-id')[:per_page + 1])
+	return KeysetPage(posts[:per_page], request, prefix, len(posts) > per_page, bool(after))
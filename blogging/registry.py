@@ -0,0 +1,103 @@
+"""
+Registry of the wrapper and form classes of every content type.
+
+The classes of each BlogContentType are built once, on first use, from its
+stored field definitions (see blogging.schema) and kept keyed by the content
+type id. Content types without stored fields fall back to their generated
+module in blogging/custom/. The registry is reloaded when a content type or
+one of its fields is saved or deleted, in every process, through a version
+kept in the default cache.
+"""
+import threading
+
+from blogging.cache import get_version, bump_version
+from blogging.wrapper import find_class
+from blogging.schema import build_classes
+
+CONTENT_TYPE_VERSION_KEY = 'blogging:content-type-version'
+
+
+class ContentTypeEntry(object):
+
+	def __init__(self, content_type, wrapper, form):
+		self.content_type = content_type
+		self.wrapper = wrapper
+		self.form = form
+
+	@property
+	def is_leaf(self):
+		return self.content_type.is_leaf
+
+
+def get_module_name(content_type):
+	return 'blogging.custom.' + str(content_type).lower()
+
+
+class ContentTypeRegistry(object):
+
+	def __init__(self):
+		self.entries = None
+		self.errors = {}
+		self.version = None
+		self.lock = threading.Lock()
+
+	def load(self):
+		from blogging.models import BlogContentType
+		entries = {}
+		errors = {}
+		for content_type in BlogContentType.objects.prefetch_related('fields'):
+			try:
+				fields = content_type.fields.all()
+				if fields:
+					wrapper, form = build_classes(content_type, fields)
+				else:
+					module_name = get_module_name(content_type)
+					wrapper = find_class(module_name, str(content_type))
+					form = find_class(module_name, str(content_type) + 'Form')
+				entries[content_type.id] = ContentTypeEntry(content_type, wrapper, form)
+			except (ImportError, AttributeError) as e:
+				errors[content_type.id] = (content_type, e)
+		self.entries = entries
+		self.errors = errors
+
+	def get_entries(self):
+		version = get_version(CONTENT_TYPE_VERSION_KEY)
+		if self.entries is None or self.version != version:
+			with self.lock:
+				self.load()
+				self.version = version
+		return self.entries
+
+	def get(self, content_type_id):
+		"""
+		Returns the ContentTypeEntry of the content type id. Raises LookupError
+		if there is no such content type or if its classes can not be loaded.
+		"""
+		entries = self.get_entries()
+		if content_type_id in entries:
+			return entries[content_type_id]
+		if content_type_id in self.errors:
+			content_type, error = self.errors[content_type_id]
+			raise LookupError('Content type %s can not be loaded: %s' % (content_type, error))
+		raise LookupError('No content type with id %s' % content_type_id)
+
+	def validate(self):
+		"""
+		Returns (content type, error) tuples for the content types whose classes can not be loaded.
+		"""
+		self.get_entries()
+		return self.errors.values()
+
+	def clear(self):
+		self.entries = None
+
+
+registry = ContentTypeRegistry()
+
+
+def content_types_changed(sender, **kwargs):
+	"""
+	Signal receiver for saves and deletes of BlogContentType and BlogContentTypeField.
+	"""
+	bump_version(CONTENT_TYPE_VERSION_KEY)
+	registry.clear()
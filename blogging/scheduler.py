@@ -0,0 +1,68 @@
+"""
+Scheduled publication of posts.
+
+Posts whose publication_start is in the future are saved with is_live off.
+publish_due() switches them live once they are due and sends post_save for
+each of them, exactly as if they had been saved, so that caches depending on
+the published posts are invalidated at that moment.
+"""
+import time
+
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from blogging.models import BlogContent
+
+
+def due_posts(now=None):
+	now = now or timezone.now()
+	return BlogContent.objects.filter(is_live=False, published_flag=True, publication_start__lte=now)
+
+
+def publish(posts):
+	"""
+	Switch the given posts live in one query and send post_save for each of them.
+	"""
+	if not posts:
+		return
+	BlogContent.objects.filter(pk__in=[post.pk for post in posts]).update(is_live=True)
+	for post in posts:
+		post.is_live = True
+		post_save.send(sender=BlogContent, instance=post, created=False,
+					   raw=False, using=post._state.db, update_fields=['is_live'])
+
+
+def publish_due(now=None):
+	"""
+	Switch the due posts live. Returns the published posts.
+	"""
+	posts = list(due_posts(now))
+	publish(posts)
+	return posts
+
+
+def next_publication(now=None):
+	"""
+	Returns the publication_start of the next scheduled post, or None.
+	"""
+	now = now or timezone.now()
+	upcoming = (BlogContent.objects.filter(is_live=False, published_flag=True, publication_start__gt=now)
+								   .order_by('publication_start')
+								   .values_list('publication_start', flat=True)[:1])
+	return upcoming[0] if upcoming else None
+
+
+def run(max_sleep=60, stdout=None):
+	"""
+	Publish posts as they become due, forever. Sleeps until the next scheduled
+	post, but at most max_sleep seconds so that newly scheduled posts are seen.
+	"""
+	while True:
+		for post in publish_due():
+			if stdout:
+				stdout.write('Published %s' % post.url_path)
+		sleep = max_sleep
+		upcoming = next_publication()
+		if upcoming is not None:
+			sleep = min(sleep, max((upcoming - timezone.now()).total_seconds(), 0))
+		time.sleep(sleep)
@@ -0,0 +1,156 @@
+"""
+Wrapper and form classes of a content type built at runtime from the field
+definitions stored in BlogContentTypeField.
+
+The classes store and read post data in the same %% X_tag %% layout as the
+ones CreateClass used to write into blogging/custom/, so posts created with a
+generated module keep rendering once its fields are stored in the database.
+"""
+import re
+
+from django import forms
+from django.db.models import Q
+from ckeditor.widgets import CKEditorWidget
+from taggit.forms import TagField
+from mptt.forms import TreeNodeChoiceField
+
+from blogging import tag_lib
+
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9_]*$')
+# names used by the wrapper or the form themselves
+RESERVED_FIELD_NAMES = ('title', 'pid_count', 'section', 'parent', 'tags', 'wrapper', 'data', 'save')
+
+
+def validate_field_names(names):
+	"""
+	Raises ValueError if a field name can not be used in a content type.
+	"""
+	seen = set()
+	for name in names:
+		if not FIELD_NAME_PATTERN.match(name):
+			raise ValueError('Field name "%s" must start with a letter and contain only letters, digits and _' % name)
+		if name.lower() in RESERVED_FIELD_NAMES:
+			raise ValueError('Field name "%s" is reserved' % name)
+		if name.lower() in seen:
+			raise ValueError('Field name "%s" is used twice' % name)
+		seen.add(name.lower())
+
+
+class ContentWrapper(object):
+	"""
+	Base of the runtime wrapper classes. field_list holds the (name, type)
+	pairs of the content type in display order.
+	"""
+	content_type_name = ''
+	is_leaf = False
+	field_list = ()
+	tag_list = []
+
+	def __init__(self):
+		for name, field_type in self.field_list:
+			setattr(self, name, '')
+		self.title = ''
+		self.pid_count = 0
+
+	def __str__(self):
+		return self.content_type_name
+
+	@classmethod
+	def get_field_names(cls):
+		return [name for name, field_type in cls.field_list]
+
+	def render_to_template(self, db_object):
+		fields = tag_lib.parse_fields(db_object, self.tag_list)
+		for tag in self.tag_list:
+			value = fields.get(tag['name'], '')
+			if tag['name'] == 'pid_count_tag':
+				value = int(value or 0)
+			setattr(self, tag_lib.get_field_name_from_tag(tag['name']), value)
+
+	def render_to_db(self, db_object):
+		data = ''
+		values = {}
+		for name, field_type in self.field_list:
+			value = getattr(self, name)
+			if self.is_leaf:
+				result = tag_lib.insert_tag_id(value, self.pid_count)
+				value = str(result['content'])
+				self.pid_count = int(result['pid_count'])
+				setattr(self, name, value)
+			data += '%% ' + name + '_tag %% ' + value + '%% endtag ' + name + '_tag %%'
+			# stored as parse_fields returns them from data
+			values[name] = ' ' + value
+		if self.is_leaf:
+			data += ' %% pid_count_tag %% ' + str(self.pid_count) + '%% endtag pid_count_tag %%'
+		db_object.title = self.title
+		db_object.data = data
+		if hasattr(db_object, 'set_field_values'):
+			db_object.set_field_values(values, self.pid_count)
+
+
+class ContentForm(forms.Form):
+	"""
+	Base of the runtime form classes. Accepts instance= like the ModelForm
+	classes of the generated modules and returns a filled wrapper from save().
+	"""
+	title = forms.CharField(max_length=100)
+	wrapper = None
+
+	def __init__(self, *args, **kwargs):
+		instance = kwargs.pop('instance', None)
+		if instance is not None:
+			initial = dict((name, getattr(instance, name, ''))
+						for name in ['title'] + self.wrapper.get_field_names())
+			initial.update(kwargs.get('initial') or {})
+			kwargs['initial'] = initial
+		super(ContentForm, self).__init__(*args, **kwargs)
+
+	def save(self):
+		instance = self.wrapper()
+		instance.title = self.cleaned_data['title']
+		for name in self.wrapper.get_field_names():
+			setattr(instance, name, self.cleaned_data[name])
+		return instance
+
+
+def get_form_field(field_type):
+	if field_type == 'TextField':
+		return forms.CharField(widget=CKEditorWidget())
+	return forms.CharField()
+
+
+def build_classes(content_type, fields):
+	"""
+	Returns the (wrapper, form) classes of content_type from its
+	BlogContentTypeField rows.
+	"""
+	from blogging.models import BlogParent
+	name = str(content_type)
+	field_list = tuple((str(field.name), str(field.field_type)) for field in fields)
+	tag_list = [{'name': field_name + '_tag', 'type': field_type} for field_name, field_type in field_list]
+	tag_list.append({'name': 'title_tag', 'type': 'CharField'})
+	if content_type.is_leaf:
+		tag_list.append({'name': 'pid_count_tag', 'type': 'IntegerField'})
+
+	wrapper = type(name, (ContentWrapper,), {
+		'content_type_name': name,
+		'is_leaf': content_type.is_leaf,
+		'field_list': field_list,
+		'tag_list': tag_list,
+	})
+
+	attrs = {'wrapper': wrapper}
+	for field_name, field_type in field_list:
+		attrs[field_name] = get_form_field(field_type)
+	if content_type.is_leaf:
+		attrs['section'] = forms.ModelChoiceField(
+							queryset=BlogParent.objects.all().filter(~Q(title="Orphan"),~Q(title="Blog"),children=None,),
+							empty_label=None,
+							required = True,
+							label = "Select Parent")
+		attrs['tags'] = TagField(help_text= "comma seperated fields for tags")
+	else:
+		attrs['parent'] = TreeNodeChoiceField(queryset=BlogParent.objects.all().filter(~Q(title="Orphan"),~Q(title="Blog")),
+											required=False, empty_label=None, label = "Select Parent")
+	form = type(name + 'Form', (ContentForm,), attrs)
+	return wrapper, form
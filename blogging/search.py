@@ -0,0 +1,191 @@
+"""
+Full text search over posts, backed by an SQLite FTS5 table.
+
+The table holds, for every post, its title and the plain text of its data (field
+tags, images and html removed, as for the summary) with the post id as rowid.
+It is kept in sync by the post_save and post_delete signals of BlogContent and
+can be rebuilt with the rebuild_search_index command. On databases other than
+SQLite (or SQLite builds without FTS5) search falls back to a title lookup.
+"""
+from django.db import connection, DatabaseError
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from blogging.models import BlogContent
+from blogging.utils import get_text_from_data
+
+SEARCH_TABLE = 'blogging_search'
+# control characters marking the matches in snippets, replaced by <mark> once the text is escaped
+MATCH_START = u'\x02'
+MATCH_END = u'\x03'
+
+_available = None
+
+
+def is_available():
+	"""
+	Returns True if the FTS5 table can be used, creating it if needed.
+	"""
+	global _available
+	if _available is not None:
+		return _available
+	available = False
+	if connection.vendor == 'sqlite':
+		try:
+			connection.cursor().execute(
+				"CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, body, tokenize='porter unicode61')"
+				% SEARCH_TABLE)
+			available = True
+		except DatabaseError:
+			pass
+	# a table created inside a transaction goes away if it is rolled back
+	if not connection.in_atomic_block:
+		_available = available
+	return available
+
+
+def get_index_row(post):
+	return (post.pk, post.title, get_text_from_data(post.data))
+
+
+def index_posts(posts):
+	"""
+	Add or replace posts in the index.
+	"""
+	if not is_available():
+		return
+	rows = [get_index_row(post) for post in posts]
+	cursor = connection.cursor()
+	cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE, [(row[0],) for row in rows])
+	cursor.executemany('INSERT INTO %s (rowid, title, body) VALUES (%%s, %%s, %%s)' % SEARCH_TABLE, rows)
+
+
+def unindex_post(pk):
+	if is_available():
+		connection.cursor().execute('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE, [pk])
+
+
+def rebuild_index(chunk_size=500):
+	"""
+	Index every post again. Returns the number of indexed posts.
+	"""
+	if not is_available():
+		return 0
+	connection.cursor().execute('DELETE FROM %s' % SEARCH_TABLE)
+	count = 0
+	last_pk = 0
+	while True:
+		posts = list(BlogContent.objects.filter(pk__gt=last_pk).order_by('pk').only('id', 'title', 'data')[:chunk_size])
+		if not posts:
+			return count
+		index_posts(posts)
+		count += len(posts)
+		last_pk = posts[-1].pk
+
+
+def get_match_query(terms):
+	"""
+	Quote every word of the user query so that it is matched literally.
+	"""
+	return ' '.join('"%s"' % word.replace('"', '""') for word in terms.split())
+
+
+def filter_matches(queryset, terms):
+	"""
+	Restricts a BlogContent queryset to the posts matching terms, with a
+	subquery so that any number of matches can be selected.
+	"""
+	where = '%s.%s IN (SELECT rowid FROM %s WHERE %s MATCH %%s)' % (
+		connection.ops.quote_name(BlogContent._meta.db_table),
+		connection.ops.quote_name(BlogContent._meta.pk.column),
+		SEARCH_TABLE, SEARCH_TABLE)
+	return queryset.extra(where=[where], params=[get_match_query(terms)])
+
+
+def format_snippet(snippet):
+	"""
+	Escapes the text of a snippet and only then marks its matches with <mark>.
+	"""
+	snippet = escape(snippet or '')
+	return mark_safe(snippet.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+class SearchResults(object):
+	"""
+	Ranked matches of a query, usable as the object list of a Paginator.
+	Posts of a page are loaded with one query and carry the matching
+	extract of their text as `snippet`.
+	"""
+
+	def __init__(self, terms, live_only=True):
+		self.query = get_match_query(terms)
+		self.live_only = live_only
+		self._count = None
+
+	def _where(self):
+		where = '%s MATCH %%s' % SEARCH_TABLE
+		if self.live_only:
+			where += ' AND rowid IN (SELECT %s FROM %s WHERE %s = 1)' % (
+				connection.ops.quote_name(BlogContent._meta.pk.column),
+				connection.ops.quote_name(BlogContent._meta.db_table),
+				connection.ops.quote_name(BlogContent._meta.get_field('is_live').column))
+		return where
+
+	def count(self):
+		if self._count is None:
+			if not self.query:
+				self._count = 0
+			elif is_available():
+				cursor = connection.cursor()
+				cursor.execute('SELECT COUNT(*) FROM %s WHERE %s' % (SEARCH_TABLE, self._where()), [self.query])
+				self._count = cursor.fetchone()[0]
+			else:
+				self._count = self.fallback_queryset().count()
+		return self._count
+
+	def __len__(self):
+		return self.count()
+
+	def fallback_queryset(self):
+		manager = BlogContent.published if self.live_only else BlogContent.objects
+		return manager.listing().filter(title__icontains=' '.join(self.query.replace('"', ' ').split()))
+
+	def ids(self, offset=0, limit=None):
+		"""
+		Returns the (post id, snippet) tuples of the matches, best first.
+		"""
+		if not self.query:
+			return []
+		if not is_available():
+			queryset = self.fallback_queryset()
+			queryset = queryset[offset:offset + limit] if limit else queryset[offset:]
+			return [(pk, '') for pk in queryset.values_list('pk', flat=True)]
+		cursor = connection.cursor()
+		cursor.execute(
+			"SELECT rowid, snippet(%s, 1, %%s, %%s, '...', 24) FROM %s WHERE %s ORDER BY rank LIMIT %%s OFFSET %%s"
+			% (SEARCH_TABLE, SEARCH_TABLE, self._where()),
+			[MATCH_START, MATCH_END, self.query, limit if limit else -1, offset])
+		return [(pk, format_snippet(snippet)) for pk, snippet in cursor.fetchall()]
+
+	def __getitem__(self, index):
+		if not isinstance(index, slice):
+			return self[index:index + 1][0]
+		offset = index.start or 0
+		limit = index.stop - offset if index.stop is not None else None
+		matches = self.ids(offset, limit)
+		posts = BlogContent.objects.listing().in_bulk([pk for pk, snippet in matches])
+		results = []
+		for pk, snippet in matches:
+			if pk in posts:
+				posts[pk].snippet = snippet
+				results.append(posts[pk])
+		return results
+
+
+def post_saved(sender, instance, raw=False, **kwargs):
+	if not raw:
+		index_posts([instance])
+
+
+def post_deleted(sender, instance, **kwargs):
+	unindex_post(instance.pk)
@@ -0,0 +1,176 @@
+"""
+Sitemap index and paged sitemaps of the sections, posts and tags.
+
+A sitemap page holds the objects whose id falls in a fixed range of
+BLOGGING_SITEMAP_SIZE ids, so an object always stays on the same page. Every
+page of the posts sitemap has a version counter bumped by the post signals,
+so a post change touches a single page. The pages also depend on the tree
+version, since section paths are part of the post urls, and the tags pages
+on the content version, since tags come and go as posts are published.
+A page is generated from chunked value queries, streamed to the client while
+it is written to the cache, and served from the cache until its versions
+change. Memory use depends on the page size, not on the number of urls.
+
+Settings:
+	BLOGGING_SITEMAP_SIZE -- ids covered by a sitemap page (default 10000,
+	the protocol allows at most 50000 urls per page).
+"""
+import hashlib
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.encoding import iri_to_uri
+
+from blogging.cache import get_version, bump_version, conditional_page, get_content_version
+from blogging.models import BlogContent, BlogParent, TagCount
+from blogging.tree import TREE_VERSION_KEY
+
+SITEMAP_VERSION_KEY = 'blogging:sitemap-version:%s:%d'
+CHUNK_SIZE = 1000
+KINDS = ('sections', 'posts', 'tags')
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+FOOTER = '</urlset>\n'
+
+
+def get_page_size():
+	return getattr(settings, 'BLOGGING_SITEMAP_SIZE', 10000)
+
+
+def get_page(pk):
+	return pk // get_page_size()
+
+
+def bump_pages(kind, ids):
+	for page in set(get_page(pk) for pk in ids):
+		bump_version(SITEMAP_VERSION_KEY % (kind, page))
+
+
+def post_changed(sender, instance, **kwargs):
+	"""
+	Signal receiver for saves and deletes of posts.
+	"""
+	if not kwargs.get('raw') and instance.pk is not None:
+		bump_pages('posts', [instance.pk])
+
+
+def iterate_chunks(queryset, fields):
+	"""
+	Yields the values of fields, led by pk, of the objects of queryset in pk
+	order, fetching CHUNK_SIZE rows per query.
+	"""
+	last_pk = None
+	while True:
+		chunk = queryset.order_by('pk')
+		if last_pk is not None:
+			chunk = chunk.filter(pk__gt=last_pk)
+		rows = list(chunk.values_list('pk', *fields)[:CHUNK_SIZE])
+		if not rows:
+			return
+		for row in rows:
+			yield row
+		last_pk = rows[-1][0]
+
+
+def url_entry(location, last_modified=None):
+	entry = '<url><loc>%s</loc>' % escape(iri_to_uri(location))
+	if last_modified:
+		entry += '<lastmod>%s</lastmod>' % last_modified.strftime('%Y-%m-%d')
+	return entry + '</url>\n'
+
+
+def get_range(page):
+	size = get_page_size()
+	return {'pk__gte': page * size, 'pk__lt': (page + 1) * size}
+
+
+def section_entries(request, page):
+	root = reverse('blogging:section-view')
+	sections = BlogParent.objects.exclude(title='Orphan').filter(**get_range(page))
+	for pk, path in iterate_chunks(sections, ['path']):
+		yield url_entry(request.build_absolute_uri(root + path + '/'))
+
+
+def post_entries(request, page):
+	root = reverse('blogging:section-view')
+	posts = BlogContent.published.filter(**get_range(page))
+	for pk, url_path, last_modified in iterate_chunks(posts, ['url_path', 'last_modified']):
+		yield url_entry(request.build_absolute_uri(root + url_path + '/'), last_modified)
+
+
+def tag_entries(request, page):
+	tag_range = get_range(page)
+	counts = TagCount.objects.filter(section=None, count__gt=0, tag__gte=tag_range['pk__gte'],
+									 tag__lt=tag_range['pk__lt'])
+	for pk, name in iterate_chunks(counts, ['tag__name']):
+		yield url_entry(request.build_absolute_uri(reverse('blogging:tagged-posts', kwargs={'tag': name})))
+
+
+ENTRIES = {
+	'sections': section_entries,
+	'posts': post_entries,
+	'tags': tag_entries,
+}
+
+
+def get_page_versions(kind, page):
+	version = get_version(TREE_VERSION_KEY)
+	if kind == 'sections':
+		return 'sitemap:%s:%s' % (kind, version)
+	if kind == 'tags':
+		return 'sitemap:%s:%s:%s' % (kind, version, get_content_version())
+	return 'sitemap:%s:%s:%s' % (kind, version, get_version(SITEMAP_VERSION_KEY % (kind, int(page))))
+
+
+def page_validators(request, kind, page):
+	return get_page_versions(kind, page), None
+
+
+def cached_stream(key, parts):
+	"""
+	Yields parts and stores their concatenation under key once all were sent.
+	"""
+	content = []
+	for part in parts:
+		content.append(part)
+		yield part
+	cache.set(key, ''.join(content), None)
+
+
+@conditional_page(page_validators)
+def sitemap(request, kind, page):
+	if kind not in ENTRIES:
+		raise Http404
+	key = 'blogging:sitemap:%s:%s:%s' % (get_page_versions(kind, page), int(page),
+										 hashlib.md5(request.build_absolute_uri('/')).hexdigest())
+	content = cache.get(key)
+	if content is not None:
+		return HttpResponse(content, content_type='application/xml')
+	parts = chain([HEADER], ENTRIES[kind](request, int(page)), [FOOTER])
+	return StreamingHttpResponse(cached_stream(key, parts), content_type='application/xml')
+
+
+def sitemap_index(request):
+	"""
+	Lists the pages of every sitemap, up to the page of the highest id.
+	"""
+	highest = {
+		'sections': BlogParent.objects.aggregate(Max('id'))['id__max'],
+		'posts': BlogContent.objects.aggregate(Max('id'))['id__max'],
+		'tags': TagCount.objects.filter(section=None).aggregate(Max('tag'))['tag__max'],
+	}
+	parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+			 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+	for kind in KINDS:
+		if highest[kind] is None:
+			continue
+		for page in range(get_page(highest[kind]) + 1):
+			location = reverse('blogging:sitemap', kwargs={'kind': kind, 'page': page})
+			parts.append('<sitemap><loc>%s</loc></sitemap>\n' % escape(request.build_absolute_uri(location)))
+	parts.append('</sitemapindex>\n')
+	return HttpResponse(''.join(parts), content_type='application/xml')
@@ -0,0 +1,107 @@
+"""
+Maintenance of the TagCount table.
+
+Counts are changed incrementally when tags are added to or removed from live
+posts and when posts go live, are unpublished or change section. Bulk
+operations which bypass the signals rebuild the counts of the sections they
+touch, and rebuild_tag_counts() recomputes everything.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F
+from taggit.models import TaggedItem
+
+from blogging.models import BlogContent, TagCount
+
+
+def get_post_content_type():
+	return ContentType.objects.get_for_model(BlogContent)
+
+
+def apply_tag_count_deltas(deltas):
+	"""
+	deltas maps (tag id, section id or None) to the change of the count.
+	"""
+	for (tag_id, section_id), delta in deltas.items():
+		if not delta:
+			continue
+		updated = TagCount.objects.filter(tag=tag_id, section=section_id).update(count=F('count') + delta)
+		if not updated and delta > 0:
+			TagCount.objects.create(tag_id=tag_id, section_id=section_id, count=delta)
+
+
+def add_deltas(deltas, tag_id, section_id, delta):
+	for key in ((tag_id, None), (tag_id, section_id)):
+		deltas[key] = deltas.get(key, 0) + delta
+
+
+def count_post_tags(post, delta, section_id=None):
+	"""
+	Add delta to the counts of every tag of post, in its section or section_id.
+	"""
+	section_id = section_id or post.section_id
+	deltas = {}
+	tag_ids = TaggedItem.objects.filter(content_type=get_post_content_type(),
+										object_id=post.pk).values_list('tag', flat=True)
+	for tag_id in tag_ids:
+		add_deltas(deltas, tag_id, section_id, delta)
+	apply_tag_count_deltas(deltas)
+
+
+def rebuild_tag_counts(section_ids=None):
+	"""
+	Recompute the counts of the given sections, or all the counts if section_ids is None.
+	"""
+	live = BlogContent.published.order_by()
+	if section_ids is None:
+		TagCount.objects.all().delete()
+		scopes = [None] + list(live.values_list('section', flat=True).distinct())
+	else:
+		TagCount.objects.filter(section__in=section_ids).delete()
+		scopes = section_ids
+	rows = []
+	for section_id in scopes:
+		posts = live if section_id is None else live.filter(section=section_id)
+		counts = (TaggedItem.objects.filter(content_type=get_post_content_type(),
+											object_id__in=posts.values('pk'))
+									.values('tag')
+									.annotate(count=Count('id')))
+		rows.extend(TagCount(tag_id=row['tag'], section_id=section_id, count=row['count'])
+					for row in counts)
+	TagCount.objects.bulk_create(rows)
+
+
+def remember_post_state(sender, instance, **kwargs):
+	# __dict__ is used so that deferred fields are not loaded
+	instance._tag_count_state = (instance.__dict__.get('is_live'), instance.__dict__.get('section_id'))
+
+
+def post_saved(sender, instance, created, raw=False, **kwargs):
+	was_live, old_section_id = getattr(instance, '_tag_count_state', (None, None))
+	instance._tag_count_state = (instance.is_live, instance.section_id)
+	if raw or created or was_live is None:
+		return
+	if (was_live, old_section_id) == (instance.is_live, instance.section_id):
+		return
+	if was_live:
+		count_post_tags(instance, -1, old_section_id)
+	if instance.is_live:
+		count_post_tags(instance, 1)
+
+
+def _tagged_item_changed(item, delta):
+	if item.content_type_id != get_post_content_type().id:
+		return
+	section_ids = list(BlogContent.published.filter(pk=item.object_id).values_list('section', flat=True))
+	if section_ids:
+		deltas = {}
+		add_deltas(deltas, item.tag_id, section_ids[0], delta)
+		apply_tag_count_deltas(deltas)
+
+
+def tagged_item_saved(sender, instance, created, raw=False, **kwargs):
+	if created and not raw:
+		_tagged_item_changed(instance, 1)
+
+
+def tagged_item_deleted(sender, instance, **kwargs):
+	_tagged_item_changed(instance, -1)
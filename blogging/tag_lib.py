@@ -1,7 +1,11 @@
 import re
+import json
 
 from bs4 import BeautifulSoup
 
+from blogging.annotator import annotate, Unsupported
+from blogging.timing import timed
+
 
 def get_field_name_from_tag(current_tag):
     field_name = current_tag.split("_")[0:-1]
@@ -16,30 +20,94 @@ def get_pattern(current_tag):
     return final_pattern
 
 
+## compiled field patterns, keyed by the tuple of tag names of a content type
+_field_patterns = {}
+
+
+def get_field_pattern(tag_list):
+    """
+    Return the compiled pattern matching any field of the content type described
+    by tag_list. Group 1 is the tag name and group 2 the field content.
+    Patterns are compiled once per content type and cached.
+    """
+    key = tuple(str(tag['name']) for tag in tag_list)
+    patt = _field_patterns.get(key)
+    if patt is None:
+        names = '|'.join(re.escape(name) for name in key)
+        ## DOTALL flag for including new line also
+        patt = re.compile("\\%\\% (" + names + ") \\%\\%(.*?)\\%\\% endtag \\1 \\%\\%",
+                          flags=re.DOTALL)
+        _field_patterns[key] = patt
+    return patt
+
+
+## any field of any content type, group 1 is the field name
+ALL_FIELDS_PATTERN = re.compile("\\%\\% (\\w+)_tag \\%\\%(.*?)\\%\\% endtag \\1_tag \\%\\%", flags=re.DOTALL)
+
+
+@timed('tag_lib')
+def scan_fields(data):
+    """
+    Return the content of every field found in the tagged text data, keyed by
+    field name. pid_count is returned as stored, a string.
+    """
+    values = {}
+    for match in ALL_FIELDS_PATTERN.finditer(data):
+        values.setdefault(match.group(1), match.group(2))
+    return values
+
+
+def get_field_values(db_object):
+    """
+    Return the structured field values of db_object keyed by field name, or
+    None if it has none (sections, and posts not yet migrated). The decoded
+    values are kept on the object.
+    """
+    stored = getattr(db_object, 'field_values', '')
+    if not stored:
+        return None
+    cached = getattr(db_object, '_field_values', None)
+    if cached is None or cached[0] is not stored:
+        cached = (stored, json.loads(stored))
+        db_object._field_values = cached
+    return cached[1]
+
+
+@timed('tag_lib')
+def parse_fields(db_object, tag_list):
+    """
+    Return a dictionary containing the content of every field of tag_list,
+    keyed by tag name. Posts with structured field values are read from them;
+    other objects are parsed from db_object.data in one pass. title_tag is not
+    stored with the fields so it is taken from db_object.title.
+    """
+    values = get_field_values(db_object)
+    if values is None:
+        fields = {}
+        for match in get_field_pattern(tag_list).finditer(db_object.data):
+            fields.setdefault(match.group(1), match.group(2))
+    else:
+        fields = dict((str(tag['name']), values.get(get_field_name_from_tag(str(tag['name'])), ''))
+                      for tag in tag_list)
+        fields['pid_count_tag'] = db_object.pid_count
+    fields['title_tag'] = db_object.title
+    return fields
+
+
+@timed('tag_lib')
 def parse_content(db_object, tag):
     if str(tag['name']) == 'title_tag':
         return db_object.title
-    final_pattern = get_pattern(tag)
-    print "pattern to be found ", final_pattern
-    ## DOTALL flag for including new line also
-    patt = re.compile(final_pattern,flags=re.DOTALL)
-    print "pattern  ", patt
-
-#     print "data ", db_object.data
-    result = patt.search(db_object.data)
-#     print result
-    return result.group(1)
+    return parse_fields(db_object, [tag])[str(tag['name'])]
 
+@timed('tag_lib')
 def strip_tag_from_data(data):
     p = re.compile('\\%\\% .*? \\%\\%',flags=re.DOTALL)
-    print "LOGS:: Stripping tags from data"
     line = p.sub('', data)
     return line
 
     
 def has_no_id(tag):
-    
-    print "tag return has no id ", tag.has_attr('id')
     return  not tag.has_attr('id')
 
 
@@ -48,19 +116,11 @@ def has_enough_length(tag):
     """
     check for tag.string --> if it is None then it has more than one children.
     """
-    print "has_enough_length()-->", tag.name
-    
     if tag.string is None:
         tag_string = ''.join(str(tag_child) for tag_child in tag.contents)
-        print "Printing contents string ", tag_string 
-        flag = len(tag_string) > 100
-        print "returning ", flag
-        return flag
+        return len(tag_string) > 100
     else:
-        print "Printing string ", tag.string
-        flag = len(tag.string) > 100
-        print "returning ", flag
-        return flag
+        return len(tag.string) > 100
 #     
 #     
 #     try:
@@ -89,7 +149,8 @@ def has_eligible_child(tag):
             return True
     return False
 
-def insert_tag_id(data,id_count):
+@timed('tag_lib')
+def insert_tag_id_soup(data,id_count):
     """
     
     Search for all children of body tag:
@@ -122,19 +183,12 @@ def insert_tag_id(data,id_count):
 
     filter_elements = ['p','span','img']
 
-    print "Entering Soup"
     soup = BeautifulSoup(data)
 
-    print "printing original html "
-    initial_content = ''.join(str(tag) for tag in soup.body.contents)
-    initial_content = initial_content.replace('\xc2\xa0', ' ')
-    print initial_content
-
     
     for tag in soup.body.children:
         
         if tag.name == 'p' and has_no_id(tag):
-            print "setting tag p"
             id_count = id_count + 1
             tag['id'] = id_count 
 
@@ -142,11 +196,9 @@ def insert_tag_id(data,id_count):
             if has_eligible_child(tag) == True:
                 for tag_child in tag.contents:
                     if tag_child.name == 'li' and has_no_id(tag_child):
-                        print "setting tag ",tag_child.name 
                         id_count = id_count + 1
                         tag_child['id'] = id_count 
             else:
-                print "setting tag ", tag.name
                 id_count = id_count + 1
                 tag['id'] =  id_count
         elif tag.name == 'img' and has_no_id(tag):
@@ -160,13 +212,24 @@ def insert_tag_id(data,id_count):
             tag_child['style'] = " "
 
         
-    print "Now printing altered html "
     final_content = ''.join(str(tag) for tag in soup.body.contents)
     final_content = final_content.replace('\xc2\xa0', ' ')
-    print final_content
     
     return_dict = {}
     return_dict['content'] = final_content
     return_dict['pid_count'] = id_count 
     
     return return_dict
+
+
+@timed('tag_lib')
+def insert_tag_id(data, id_count):
+    """
+    Same result as insert_tag_id_soup, computed by the streaming annotator.
+    Markup the annotator can not reproduce exactly goes through BeautifulSoup.
+    """
+    try:
+        content, id_count = annotate(data, id_count)
+    except Unsupported:
+        return insert_tag_id_soup(data, id_count)
+    return {'content': content, 'pid_count': id_count}
@@ -144,3 +144,13 @@ class ContactTag(InclusionTag):
 
 register.tag(ContentRender)
 register.tag(ContactTag)
+
+
+@register.inclusion_tag('blogging/includes/archive_widget.html')
+def render_archive(current=None):
+    """
+    Years and months with posts and their counts, read from ArchiveCount.
+    current is the archive dictionary of the archive pages, to mark the open period.
+    """
+    from blogging.archive_counts import get_years
+    return {'years': get_years(), 'current': current or {}}
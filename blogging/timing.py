@@ -0,0 +1,207 @@
+"""
+Per-request timing of the blogging views and plugins.
+
+TimingMiddleware, or the timed_view decorator for single views, records for
+each request its wall time, the number and time of its database queries and
+the time spent rendering templates, in the tag_lib and utils helpers and in
+the blogging plugins. The numbers are sent back in a Server-Timing header and
+logged as one json line on the 'blogging.timing' logger. Categories overlap:
+queries run while a template renders count in both.
+
+Settings:
+	BLOGGING_TIMING_HEADER -- send the Server-Timing header (default True).
+"""
+import json
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+logger = logging.getLogger('blogging.timing')
+
+_local = threading.local()
+
+# categories reported by timed(), in header order
+CATEGORIES = ('template', 'plugins', 'tag_lib', 'utils')
+
+
+class RequestTimer(object):
+
+	def __init__(self):
+		self.start = time.time()
+		self.view = None
+		self.seconds = {}
+		self.calls = {}
+		self.active = set()
+		self.query_marks = []
+
+	def add(self, category, seconds):
+		self.seconds[category] = self.seconds.get(category, 0.0) + seconds
+		self.calls[category] = self.calls.get(category, 0) + 1
+
+	def watch_queries(self):
+		"""
+		Makes every connection log its queries for the request, as it does with DEBUG on.
+		"""
+		from django.db import connections
+		for connection in connections.all():
+			self.query_marks.append((connection, connection.use_debug_cursor, len(connection.queries)))
+			connection.use_debug_cursor = True
+
+	def collect_queries(self):
+		"""
+		Returns (count, seconds) of the queries of the request and restores the connections.
+		"""
+		count = 0
+		seconds = 0.0
+		for connection, use_debug_cursor, mark in self.query_marks:
+			queries = connection.queries[mark:]
+			count += len(queries)
+			seconds += sum(float(query['time']) for query in queries)
+			if not settings.DEBUG:
+				del connection.queries[mark:]
+			connection.use_debug_cursor = use_debug_cursor
+		self.query_marks = []
+		return count, seconds
+
+	def finish(self):
+		"""
+		Returns the metrics of the request as (name, milliseconds, count) tuples.
+		"""
+		total = time.time() - self.start
+		query_count, query_seconds = self.collect_queries()
+		metrics = [('total', total * 1000, None), ('db', query_seconds * 1000, query_count)]
+		for category in CATEGORIES:
+			if category in self.seconds:
+				metrics.append((category, self.seconds[category] * 1000, self.calls[category]))
+		return metrics
+
+
+def get_timer():
+	return getattr(_local, 'timer', None)
+
+
+def start_timer():
+	_local.timer = RequestTimer()
+	_local.timer.watch_queries()
+	return _local.timer
+
+
+def stop_timer():
+	timer = get_timer()
+	_local.timer = None
+	return timer
+
+
+def timed(category):
+	"""
+	Decorator adding the time spent in the function to category of the
+	current request. Nested calls in the same category are counted once.
+	Costs one thread local lookup when no request is timed.
+	"""
+	def decorator(func):
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			timer = getattr(_local, 'timer', None)
+			if timer is None or category in timer.active:
+				return func(*args, **kwargs)
+			timer.active.add(category)
+			start = time.time()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				timer.active.discard(category)
+				timer.add(category, time.time() - start)
+		wrapper.blogging_timed = True
+		return wrapper
+	return decorator
+
+
+def instrument_templates():
+	"""
+	Times Template.render, once per process. Included templates count in
+	the time of the template including them.
+	"""
+	from django.template.base import Template
+	if not getattr(Template.render, 'blogging_timed', False):
+		Template.render = timed('template')(Template.render)
+
+
+def format_server_timing(metrics):
+	parts = []
+	for name, milliseconds, count in metrics:
+		part = '%s;dur=%.1f' % (name, milliseconds)
+		if count is not None:
+			part += ';desc="%d %s"' % (count, 'queries' if name == 'db' else 'calls')
+		parts.append(part)
+	return ', '.join(parts)
+
+
+def report(request, response, timer):
+	metrics = timer.finish()
+	if getattr(settings, 'BLOGGING_TIMING_HEADER', True):
+		response['Server-Timing'] = format_server_timing(metrics)
+	record = {
+		'method': request.method,
+		'path': request.path,
+		'view': timer.view,
+		'status': response.status_code,
+	}
+	for name, milliseconds, count in metrics:
+		record[name + '_ms'] = round(milliseconds, 1)
+		if count is not None:
+			record[name + ('_queries' if name == 'db' else '_calls')] = count
+	logger.info(json.dumps(record, sort_keys=True))
+
+
+def get_view_name(view_func):
+	return '%s.%s' % (view_func.__module__, getattr(view_func, '__name__', view_func.__class__.__name__))
+
+
+class TimingMiddleware(object):
+	"""
+	Times every request, see the module documentation.
+	"""
+
+	def __init__(self):
+		instrument_templates()
+
+	def process_request(self, request):
+		start_timer()
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		timer = get_timer()
+		if timer is not None:
+			timer.view = get_view_name(view_func)
+
+	def process_response(self, request, response):
+		timer = stop_timer()
+		if timer is not None:
+			report(request, response, timer)
+		return response
+
+
+def timed_view(view_func):
+	"""
+	Times a single view like TimingMiddleware. Does nothing more when the
+	middleware already times the request.
+	"""
+	@wraps(view_func)
+	def wrapper(request, *args, **kwargs):
+		if get_timer() is not None:
+			return view_func(request, *args, **kwargs)
+		instrument_templates()
+		timer = start_timer()
+		timer.view = get_view_name(view_func)
+		try:
+			response = view_func(request, *args, **kwargs)
+		except Exception:
+			stop_timer()
+			timer.collect_queries()
+			raise
+		stop_timer()
+		report(request, response, timer)
+		return response
+	return wrapper
@@ -0,0 +1,161 @@
+"""
+In-process snapshot of the BlogParent tree.
+
+The whole section tree is loaded with a single query into immutable SectionNode
+objects and kept in memory by every process. A tree version stored in the
+default cache is bumped whenever a BlogParent is saved or deleted; a process
+rebuilds its snapshot when it sees a new version, or after
+BLOGGING_TREE_SNAPSHOT_TIMEOUT seconds (default 300) at the latest.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+
+from blogging.cache import get_version, bump_version, is_bump_pending
+
+TREE_VERSION_KEY = 'blogging:tree-version'
+
+
+class SectionNode(object):
+	"""
+	Read only copy of a BlogParent, with the parts used for navigation.
+	"""
+	__slots__ = ('id', 'parent_id', 'tree_id', 'lft', 'rght', 'level', 'slug',
+				 'path', 'title', 'image_url', 'ancestor_ids', 'child_ids')
+
+	def __init__(self, **kwargs):
+		for name in self.__slots__:
+			object.__setattr__(self, name, kwargs[name])
+
+	def __setattr__(self, name, value):
+		raise AttributeError('SectionNode is immutable')
+
+	@property
+	def pk(self):
+		return self.id
+
+	def __unicode__(self):
+		return self.title
+
+	def is_leaf_node(self):
+		return not self.child_ids
+
+	def get_absolute_url(self):
+		return reverse('blogging:teaser-view', kwargs={'slug': self.path})
+
+	def get_image_url(self):
+		return self.image_url or None
+
+	def get_menu_title(self):
+		return self.title
+
+	def form_url(self):
+		return self.path
+
+
+class TreeSnapshot(object):
+
+	def __init__(self, rows):
+		"""
+		rows are (id, parent id, tree id, lft, rght, level, slug, title, image url)
+		tuples ordered by tree id and lft, so that parents come before children.
+		"""
+		self.nodes = {}
+		self.by_path = {}
+		self.roots = []
+		children = {}
+		parents = {}
+		for pk, parent_id, tree_id, lft, rght, level, slug, title, image_url in rows:
+			children[pk] = []
+			if parent_id is None:
+				path, ancestor_ids = slug, ()
+				self.roots.append(pk)
+			else:
+				parent_path, parent_ancestors = parents[parent_id]
+				path, ancestor_ids = parent_path + '/' + slug, parent_ancestors + (parent_id,)
+				children[parent_id].append(pk)
+			parents[pk] = (path, ancestor_ids)
+			self.nodes[pk] = dict(id=pk, parent_id=parent_id, tree_id=tree_id, lft=lft, rght=rght,
+								  level=level, slug=slug, path=path, title=title,
+								  image_url=image_url, ancestor_ids=ancestor_ids)
+		for pk, values in self.nodes.items():
+			self.nodes[pk] = SectionNode(child_ids=tuple(children[pk]), **values)
+			self.by_path[values['path']] = self.nodes[pk]
+		self.roots = [self.nodes[pk] for pk in self.roots]
+
+	def get(self, pk):
+		return self.nodes.get(pk)
+
+	def get_by_path(self, path):
+		"""
+		Returns the node with the given slug path. As urls used to be resolved
+		with their last slug only, a node whose slug matches is returned otherwise.
+		"""
+		node = self.by_path.get(path.strip('/'))
+		if node is None:
+			slug = path.strip('/').split('/')[-1]
+			for candidate in self.nodes.values():
+				if candidate.slug == slug:
+					return candidate
+		return node
+
+	def get_children(self, pk):
+		return [self.nodes[child] for child in self.nodes[pk].child_ids]
+
+	def get_descendant_ids(self, pk, include_self=False):
+		ids = [pk] if include_self else []
+		pending = list(self.nodes[pk].child_ids)
+		while pending:
+			child = pending.pop()
+			ids.append(child)
+			pending.extend(self.nodes[child].child_ids)
+		return ids
+
+	def get_ancestors(self, pk, include_self=False):
+		node = self.nodes[pk]
+		ancestors = [self.nodes[ancestor] for ancestor in node.ancestor_ids]
+		if include_self:
+			ancestors.append(node)
+		return ancestors
+
+	def get_roots(self, exclude=('Orphan',)):
+		return [node for node in self.roots if node.title not in exclude]
+
+
+_snapshot = {'tree': None, 'version': None, 'built': 0}
+_lock = threading.Lock()
+
+
+def tree_changed(sender, **kwargs):
+	"""
+	Signal receiver for saves and deletes of BlogParent.
+	"""
+	bump_version(TREE_VERSION_KEY)
+	_snapshot['tree'] = None
+
+
+def build_snapshot():
+	from blogging.models import BlogParent
+	rows = BlogParent.objects.order_by('tree_id', 'lft').values_list(
+		'id', 'parent', 'tree_id', 'lft', 'rght', 'level', 'slug', 'title', 'image_url')
+	return TreeSnapshot(rows)
+
+
+def get_tree():
+	"""
+	Returns the current TreeSnapshot.
+	"""
+	version = get_version(TREE_VERSION_KEY)
+	timeout = getattr(settings, 'BLOGGING_TREE_SNAPSHOT_TIMEOUT', 300)
+	tree = _snapshot['tree']
+	if tree is not None and _snapshot['version'] == version and time.time() - _snapshot['built'] < timeout:
+		return tree
+	if is_bump_pending(TREE_VERSION_KEY):
+		# the tree changed in a transaction not committed yet, the snapshot is not shared
+		return build_snapshot()
+	with _lock:
+		tree = build_snapshot()
+		_snapshot.update(tree=tree, version=version, built=time.time())
+	return tree
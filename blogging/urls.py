@@ -1,5 +1,7 @@
 from django.conf.urls import patterns, url
 import blogging.views as view
+from blogging.feeds import PostFeed, SectionFeed, TagFeed, AtomPostFeed, AtomSectionFeed, AtomTagFeed
+from blogging import sitemaps
 from blogging.forms import *
 
 urlpatterns = patterns(
@@ -11,17 +13,24 @@ urlpatterns = patterns(
     url(r'^content-type/$', view.content_type, name='content-type'),
     url(r'^add-model/(?P<model_name>[\w.+-/]+)/$', view.add_new_model, name='add-model-content-type'),
     url(r'^author/$', view.authors_list, name='author-list'),
-    url(r'^author/(?P<slug>[\w.@+-]+)/(?P<post_id>\d+)$', view.author_post, name='author-posts'),
-#    url(r'^feed/$', LatestEntriesFeed(), name='latest-posts-feed'),
+    url(r'^author/(?P<slug>[\w.@+-]+)/$', view.author_post, name='author-posts'),
+    url(r'^feed/$', PostFeed(), name='latest-posts-feed'),
+    url(r'^feed/atom/$', AtomPostFeed(), name='latest-posts-atom'),
+    url(r'^feed/section/(?P<slug>[\w.+-/]+)/$', SectionFeed(), name='section-feed'),
+    url(r'^feed/atom/section/(?P<slug>[\w.+-/]+)/$', AtomSectionFeed(), name='section-atom'),
+    url(r'^sitemap\.xml$', sitemaps.sitemap_index, name='sitemap-index'),
+    url(r'^sitemap-(?P<kind>sections|posts|tags)-(?P<page>\d+)\.xml$', sitemaps.sitemap, name='sitemap'),
     url(r'^(?P<year>\d{4})/$', view.archive, name='archive-year'),
     url(r'^(?P<year>\d{4})/(?P<month>\d{1,2})/$', view.archive, name='archive-month'),
     url(r'^(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})/$', view.archive, name='archive-day'),
 #    url(r'^(?P<slug>[\w.+-/]+)/(?P<post_id>\d+)$', view.detail, name='post-detail'),
     url(r'^tag/(?P<tag>[-\w]+)/$', view.tagged_post, name='tagged-posts'),
+    url(r'^tag/(?P<tag>[-\w]+)/feed/$', TagFeed(), name='tagged-posts-feed'),
+    url(r'^tag/(?P<tag>[-\w]+)/feed/atom/$', AtomTagFeed(), name='tagged-posts-atom'),
+    url(r'^diff/(?P<post_id>\d+)/$', view.post_diff, name='post-diff'),
+    url(r'^search/$', view.search, name='search'),
     url(r'^(?P<slug>[\w.+-/]+)/$', view.teaser, name='teaser-view'),
 #    url(r'^(?P<slug>\D+)(?P<post_id>\d+)$', view.detail, name='post-detail'),
 #    url(r'^(?P<path>\D*)$', view.teaser, name='teaser-view'),
 #    url(r'^tag/$', TagsListView.as_view(), name='tag-list'),
-
-#    url(r'^tag/(?P<tag>[-\w]+)/feed/$', TagFeed(), name='tagged-posts-feed'),
 )
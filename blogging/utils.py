@@ -1,45 +1,34 @@
 import os
-from blogging.create_class import CreateClass
 import re
 from django.template.defaultfilters import removetags
 from django.utils.html import strip_tags
+from blogging.tag_lib import strip_tag_from_data
+from blogging.timing import timed
 
 
-def create_content_type(name,form_dict,is_leaf):
-	filename = os.path.abspath(os.path.dirname(__file__))+"/custom/"+name.lower()+".py"
-	flag = False
-	errorstring = filename
-	try:
-		fd = open(filename, 'r')
-	except IOError:
-		flag = True
-		print "No such file exists"
-		errorstring += "\nNo such file exists"
-	if flag:
-		#We are good to go. Create the Output string that must be put in it
-		print "We're in!"
-		errorstring += "\nWe're in!"
-		create_class_object = CreateClass(name, form_dict,is_leaf)
-		string = create_class_object.form_string()
-		try:
-			fd = os.fdopen(os.open(filename,os.O_CREAT| os.O_RDWR , 0555),'w')
-			fd.write(string)
-			fd.close()
-			print file(filename).read()
-			errorstring +="\n"+file(filename).read()
-			return True
-		except IOError:
-			print "Error Opening File for Writing"
-			errorstring += "\nError Opening file for writing"
-			return False
+def create_content_type(content_type, fields):
+	"""
+	Stores the field definitions of a saved BlogContentType. fields is a list
+	of (name, type) pairs in display order. The wrapper and form classes are
+	built from them by blogging.schema, in every process, on next use.
+	Raises ValueError for a field name that can not be used.
 
-	else:
-		return False
-
-	
-	
-	
+	The caller must call blogging.registry.content_types_changed once the
+	rows are committed: bumping the registry version earlier would let
+	another process cache the registry without the new fields under the
+	new version.
+	"""
+	from blogging.models import BlogContentTypeField
+	from blogging.schema import validate_field_names
+	if not fields:
+		raise ValueError('A content type needs at least one field')
+	validate_field_names([name for name, field_type in fields])
+	BlogContentTypeField.objects.bulk_create([
+		BlogContentTypeField(content_type=content_type, name=name, field_type=field_type, position=position)
+		for position, (name, field_type) in enumerate(fields)
+	])
 
+@timed('utils')
 def get_imageurl_from_data(data):
 	matches = re.findall(
 				r'(<img[^>].*?src\s*=\s*"([^"]+)")', data
@@ -51,12 +40,23 @@ def get_imageurl_from_data(data):
 
 
 
+@timed('utils')
 def strip_image_from_data(data):	
 	p = re.compile(r'<img.*?/>',flags=re.DOTALL)
 	line = p.sub('', data)
-	print "LOGS:: Stripping images from data"
 	return line
 	
+@timed('utils')
+def get_text_from_data(data):
+	"""
+	Return the plain text of the content data, with field tags, images and
+	html markup removed.
+	"""
+	text = strip_tag_from_data(data)
+	text = strip_image_from_data(text)
+	return strip_tags(text)
+
+@timed('utils')
 def truncatewords(Value,limit=30):
 	try:
 		limit = int(limit)
@@ -13,18 +13,24 @@ from blogging.models import *
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
 from blogging.forms import *
-from blogging.create_class import CreateClass
 from django.contrib.formtools.wizard.views import SessionWizardView
 from django.forms.formsets import formset_factory
 from django.utils.html import escape
 from blogging.utils import *
 from blogging.wrapper import *
-import os, errno
 from django.db.models import Q
 from django.core.mail import send_mail, mail_admins
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, NON_FIELD_ERRORS
+from django.db import transaction
 from django.template.defaultfilters import slugify
 import reversion
+from blogging.cache import cached_page, conditional_page, get_content_version, get_version
+from blogging.pagination import paginate, PAGE_SIZE
+from blogging.tree import get_tree, TREE_VERSION_KEY
+from blogging.registry import registry, content_types_changed
+from blogging.search import SearchResults
+from blogging.archive_counts import get_range as get_archive_range
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 #from meta_tags.views import Meta 
 from blogging.utils import strip_image_from_data
@@ -58,13 +64,7 @@ def content_type(request):
 				return HttpResponseRedirect(
 		            reverse("blogging:create-post"))
 			if action == 'delete':
-				try:
-					filename = os.path.abspath(os.path.dirname(__file__))+"/custom/"+content_info.__str__().lower()+".py"
-					os.remove(filename)
-					content_info.delete()
-				except OSError as e: # this would be "except OSError, e:" before Python 2.6
-					if e.errno != errno.ENOENT: # errno.ENOENT = no such file or directory
-						raise # re-raise exception if a different error occured
+				content_info.delete()
 	else:
 		if 'content_info_id' in request.session:
 			try:
@@ -98,11 +98,13 @@ def new_post(request):
 	if 'content_info_id' not in request.session:
 		return HttpResponseRedirect(reverse("blogging:content-type"))
 
-	content_info_obj = BlogContentType.objects.get(
-	        id=request.session['content_info_id']
-    )
-	print request.session['content_info_id'], content_info_obj
-	form = find_class('blogging.custom.'+content_info_obj.__str__().lower(),str(content_info_obj)+'Form' )
+	try:
+		content_entry = registry.get(request.session['content_info_id'])
+	except LookupError:
+		del request.session['content_info_id']
+		return HttpResponseRedirect(reverse("blogging:content-type"))
+	content_info_obj = content_entry.content_type
+	form = content_entry.form
 
 	if request.method == "POST":
 		post_form = form(request.POST)
@@ -154,23 +156,19 @@ def edit_post(request,post_id):
 	try:
 		blog = BlogContent.objects.get(pk=post_id)
 		print "LOGS: EDIT ", blog.__str__()
-		form = find_class('blogging.custom.'+blog.content_type.__str__().lower(),str(blog.content_type)+'Form' )
-		print "LOGS: ContentType ", blog.content_type.__str__().lower()
+		content_entry = registry.get(blog.content_type_id)
+		form = content_entry.form
 		if request.method == "POST":
 			post_form = form(request.POST)
 			
 			if post_form.is_valid():
-				old_wrapper_class_name = find_class('blogging.custom.'+blog.content_type.__str__().lower(),str(blog.content_type))
-				old_wrapper_class = old_wrapper_class_name()
-				old_wrapper_class.render_to_template(blog)
-				
 				wrapper_class = post_form.save()
 				db_class = None
 				
-				if blog.content_type.is_leaf == True:
-					## get the pid_count from old_wrapper_class and call render_to_db --> this function will
+				if content_entry.is_leaf == True:
+					## continue from the stored pid_count and call render_to_db --> this function will
 					## set the pid counts and save values in db
-					wrapper_class.pid_count = old_wrapper_class.pid_count  
+					wrapper_class.pid_count = blog.get_pid_count()
 					db_class = blog
 					print "LOGS: Entering render_to_db"
 					wrapper_class.render_to_db(db_class)
@@ -188,10 +186,7 @@ def edit_post(request,post_id):
 										"blogging/create_page.html",
 		    				context, context_instance=RequestContext(request))
 		else:
-			wrapper_class_name = find_class('blogging.custom.'+blog.content_type.__str__().lower(),str(blog.content_type))
-			print "LOGS: Wrapper Class ", wrapper_class_name
-			print "LOGS: Content Class ", blog
-			wrapper_class = wrapper_class_name()
+			wrapper_class = content_entry.wrapper()
 			wrapper_class.render_to_template(blog)
 			print "LOGS: render to template  ", wrapper_class
 			post_form = form(instance=wrapper_class)
@@ -222,20 +217,18 @@ def add_new_model(request, model_name):
 			form1 = ContentTypeCreationForm(request.POST)
 			form2 = FieldFormSet(request.POST)
 			if form1.is_valid() and form2.is_valid():
+				fields = [(form.cleaned_data['field_name'], form.cleaned_data['field_type'])
+						for form in form2 if form.cleaned_data]
 				try:
-					form_dict = {}
-					for form in form2:
-						form_dict[form.cleaned_data['field_name']] = form.cleaned_data['field_type']
-					print "LOGS: Printing fomr dictionary: ", form_dict 
-						
-					
-					if (create_content_type(form1.cleaned_data['content_type'],form_dict,form1.cleaned_data['is_leaf']) == False ):
-						raise forms.ValidationError("something got wronged")
-					new_obj = form1.save() #TODO many things
-					print new_obj.content_type
-				except forms.ValidationError:
+					with transaction.atomic():
+						new_obj = form1.save()
+						create_content_type(new_obj, fields)
+				except ValueError as e:
+					form1._errors[NON_FIELD_ERRORS] = form1.error_class([str(e)])
 					new_obj = None
 				if new_obj:
+					# the new fields are visible to other processes only now
+					content_types_changed(BlogContentTypeField)
 					return HttpResponse('<script type="text/javascript">opener.dismissAddAnotherPopup(window, "%s", "%s");</script>' % \
                 	(escape(new_obj._get_pk_val()), escape(new_obj)))
 				else:
@@ -254,9 +247,47 @@ def add_new_model(request, model_name):
 			page_context = {'form1': form,'formset':formset,  'field': normal_model_name }
 			return render_to_response('blogging/includes/add_content_type.html', page_context, context_instance=RequestContext(request))
 
+def tree_validators(request, *args, **kwargs):
+	"""
+	Pages built from the section tree only change with the tree version.
+	"""
+	return 'tree:%s' % get_version(TREE_VERSION_KEY), None
+
+def listing_validators(request, *args, **kwargs):
+	"""
+	Post listings change with the content version, bumped by every change to
+	posts, sections and tags.
+	"""
+	return 'content:%s' % get_content_version(), None
+
+def teaser_validators(request, slug):
+	"""
+	A post page changes with the post and with the content version, which
+	covers its breadcrumb, author and sidebar; a section page changes like the
+	other listings.
+	"""
+	current_section = slug.split("/")[-1]
+	if current_section.isdigit():
+		if request.GET.get('edit', None) == 'True':
+			return None
+		rows = BlogContent.objects.filter(pk=current_section).values_list('last_modified', flat=True)
+		if not rows:
+			return None
+		last_modified = rows[0]
+		etag = 'post:%s:%s:%s' % (current_section, last_modified.isoformat(), get_content_version())
+		return etag, last_modified
+	section = get_tree().get_by_path(slug)
+	if section is None:
+		return None
+	if section.is_leaf_node():
+		return listing_validators(request)
+	return tree_validators(request)
+
+@conditional_page(tree_validators)
+@cached_page
 def index(request):
 	template = loader.get_template('blogging/section.html')
-	nodes = BlogParent.objects.all().filter(~Q(title='Orphan'),level=0)
+	nodes = get_tree().get_roots()
 	
 	context = RequestContext(request, {
 										'parent': None,
@@ -267,15 +298,93 @@ def index(request):
 
 
 
+@cached_page
 def authors_list(request):
-	return HttpResponse("Hi This is author list view ")
+	"""
+	Authors with live posts, the most recently published first. Counts are
+	read from AuthorStats.
+	"""
+	stats = AuthorStats.objects.filter(post_count__gt=0).select_related('author')
+	paginator = Paginator(stats, PAGE_SIZE)
+	try:
+		authors = paginator.page(request.GET.get('page', 1))
+	except PageNotAnInteger:
+		authors = paginator.page(1)
+	except EmptyPage:
+		authors = paginator.page(paginator.num_pages)
+	template = loader.get_template('blogging/author_list.html')
+	context = RequestContext(request, {
+                                       'authors': authors,
+                                       'page': {'title':'Authors', 'tagline':'We learn from stolen stuff'},
+                                      })
+	return HttpResponse(template.render(context))
 
-def author_post(request,slug,post_id):
-	return HttpResponse("Hi This is author post view")
+@cached_page
+def author_post(request,slug):
+	"""
+	Live posts of an author, newest first, read through the (author_id,
+	publication_start) index.
+	"""
+	try:
+		author = auth.models.User.objects.get(username=slug)
+	except auth.models.User.DoesNotExist:
+		raise Http404
+	try:
+		stats = author.blogging_stats
+	except AuthorStats.DoesNotExist:
+		stats = None
+	pagination = paginate(BlogContent.published.listing().filter(author_id=author.pk), request)
+	if request.GET.get('fragment'):
+		template = loader.get_template(teaser_template(request))
+	else:
+		template = loader.get_template('blogging/author.html')
+	context = RequestContext(request, {
+                                       'author': author,
+                                       'stats': stats,
+                                       'nodes': pagination.object_list,
+                                       'pagination': pagination,
+                                       'page': {'title':author.get_full_name() or author.username, 'tagline':'We learn from stolen stuff'},
+                                      })
+	return HttpResponse(template.render(context))
+
+@cached_page
+def archive(request, year, month=None, day=None):
+	"""
+	Posts published in a year, month or day, newest first, selected with a
+	range on publication_start so that the (publication_start, id) index is
+	used for both the range and the keyset pagination.
+	"""
+	year = int(year)
+	month = int(month) if month else None
+	day = int(day) if day else None
+	try:
+		start, end = get_archive_range(year, month, day)
+		# strftime does not accept years before 1900
+		title = start.strftime('%d %B %Y' if day else '%B %Y' if month else '%Y')
+	except (ValueError, OverflowError):
+		raise Http404
+	posts = BlogContent.published.listing().filter(publication_start__gte=start, publication_start__lt=end)
+	pagination = paginate(posts, request)
+	template = loader.get_template(teaser_template(request))
+	context = RequestContext(request, {
+                                       'nodes': pagination.object_list,
+                                       'pagination': pagination,
+                                       'archive': {'year': year, 'month': month, 'day': day},
+                                       'page': {'title':title, 'tagline':'We learn from stolen stuff'},
+                                      })
+	return HttpResponse(template.render(context))
 
-def archive(request):	
-	return HttpResponse("Hi This is archive view")
+def teaser_template(request):
+	"""
+	Post lists are rendered without the page layout when the next page is
+	loaded in place ("load more").
+	"""
+	if request.GET.get('fragment'):
+		return 'blogging/includes/teaser_page.html'
+	return 'blogging/teaser.html'
 
+@conditional_page(teaser_validators)
+@cached_page
 def teaser(request,slug):
 	current_section = slug.split("/")[-1]
 #	print current_section
@@ -285,31 +394,22 @@ def teaser(request,slug):
 		if request.GET.get('edit',None) == 'True':
 			return edit_post(request,post_id)
 		try:
-			blogs = BlogContent.objects.get(pk=post_id)
+			blogs = BlogContent.objects.defer('revision_diff').select_related('author_id').get(pk=post_id)
 		except BlogContent.DoesNotExist:
 			raise Http404
 		template = loader.get_template('blogging/detail.html')
 		try:
-			content_class_name = find_class('blogging.custom.'+blogs.content_type.__str__().lower(),blogs.content_type.__str__() )
-			content_class = content_class_name()
+			content_class = registry.get(blogs.content_type_id).wrapper()
 			print "LOGS: found class ", content_class 
 			content_class.render_to_template(blogs)
 			print "LOGS: rendered to template class ", content_class
 			
 			# Instantiate the Meta class
-			description = strip_tags(blogs.data)
-			description  = strip_tag_from_data(strip_image_from_data(description))
 			'''
 			meta = Meta(title = blogs.title, description = truncatewords(description,120), section= blogs.section.title, url = blogs.get_absolute_url(),
 					image = blogs.get_image_url(), author = blogs.author_id, date_time = blogs.publication_start ,
 					object_type = 'article', keywords = [ tags.name for tags in blogs.tags.all()])
 			'''
-			available_versions = reversion.get_for_object(blogs)
-			patch_html = ""
-			if len(available_versions) > 1 :
-				old_version = available_versions[0]
-				new_version = available_versions[1]
-				patch_html = reversion.helpers.generate_diffs(old_version, new_version, "data",cleanup="semantic")
 		except:
 			print "Unexpected error:", sys.exc_info()[0]
 			for frame in traceback.extract_tb(sys.exc_info()[2]):
@@ -318,52 +418,88 @@ def teaser(request,slug):
 			raise Http404
 
 		context = RequestContext(request, {
-										'parent': blogs.section.get_ancestors(include_self=True),		
+										'parent': get_tree().get_ancestors(blogs.section_id, include_self=True),		
                                        'nodes': blogs,
                                        'content':content_class,
                                        'page': {'title':'Pirate Learner', 'tagline':'We learn from stolen stuff'},
-                                       'patch': patch_html,
+                                       'patch_url': reverse('blogging:post-diff', kwargs={'post_id': blogs.id}),
                                        #'meta' : meta,
                                        'author': blogs.get_author(),
                                       })
 		return HttpResponse(template.render(context))
 	except ValueError:
-		try:
-			section = BlogParent.objects.get(slug = str(current_section))
-		except :	
-			print "Unexpected error:", sys.exc_info()[0]
+		tree = get_tree()
+		section = tree.get_by_path(slug)
+		if section is None:
 			raise Http404
 		if section.is_leaf_node():
-			template = loader.get_template('blogging/teaser.html')
+			template = loader.get_template(teaser_template(request))
 			print "LOGS:: This is Leaf Node"
-			nodes = BlogContent.published.filter(section=section)
+			pagination = paginate(BlogContent.published.listing().filter(section=section.id), request)
 			context = RequestContext(request, {
-										'parent':section.get_ancestors(include_self=True),
-                                       'nodes': nodes,
+										'parent':tree.get_ancestors(section.id, include_self=True),
+                                       'nodes': pagination.object_list,
+                                       'pagination': pagination,
                                        'page': {'title':section.title, 'tagline':'We learn from stolen stuff'},
                                       })
 			return HttpResponse(template.render(context))
 		template = loader.get_template('blogging/section.html')
 		print "LOGS:: This is NON Leaf Node"
 		context = RequestContext(request, {
-										'parent': section.get_ancestors(include_self=True),
-                                       'nodes': section.get_descendants(),
+										'parent': tree.get_ancestors(section.id, include_self=True),
+                                       'nodes': tree.get_children(section.id),
                                        'page': {'title':section.title, 'tagline':'We learn from stolen stuff'},
                                       })
 		return HttpResponse(template.render(context))
 
+def post_diff(request,post_id):
+	"""
+	Returns the html diff between the two latest revisions of the post. The diff
+	is computed when a revision is saved, so that the detail page does not have to.
+	"""
+	try:
+		blog = BlogContent.objects.only('id', 'revision_diff').get(pk=post_id)
+	except BlogContent.DoesNotExist:
+		raise Http404
+	return HttpResponse(blog.revision_diff)
+
+@conditional_page(listing_validators)
+@cached_page
 def tagged_post(request,tag):
 	try:
-		posts = BlogContent.objects.filter(tags__name = tag)
-		template = loader.get_template('blogging/teaser.html')
+		pagination = paginate(BlogContent.objects.listing().filter(tags__name = tag), request)
+		template = loader.get_template(teaser_template(request))
 		context = RequestContext(request, {
-                                       'nodes': posts,
+                                       'nodes': pagination.object_list,
+                                       'pagination': pagination,
                                        'page': {'title':tag, 'tagline':'We learn from stolen stuff'},
                                       })
 		return HttpResponse(template.render(context))
 	except ObjectDoesNotExist:
 		raise Http404
 
+@cached_page
+def search(request):
+	"""
+	Full text search over the published posts, best matches first.
+	"""
+	terms = request.GET.get('q', '').strip()
+	paginator = Paginator(SearchResults(terms), PAGE_SIZE)
+	try:
+		results = paginator.page(request.GET.get('page', 1))
+	except PageNotAnInteger:
+		results = paginator.page(1)
+	except EmptyPage:
+		results = paginator.page(paginator.num_pages)
+	template = loader.get_template('blogging/search.html')
+	context = RequestContext(request, {
+                                       'nodes': results.object_list,
+                                       'results': results,
+                                       'terms': terms,
+                                       'page': {'title':'Search', 'tagline':'We learn from stolen stuff'},
+                                      })
+	return HttpResponse(template.render(context))
+
 def ContactUs(request):
 	if request.method == 'POST':
 		form = ContactForm(request.POST)